@@ -0,0 +1,109 @@
+import time
+import weakref
+
+from api import trace, transport
+
+# asyncio, httpx and email.utils are imported inside the functions below:
+# only the server's event loop needs them, and the terminal game starts
+# faster without them.
+
+# Limits for the shared async client. One event loop can serve many players,
+# so allow more connections than the threaded transport does.
+MAX_CONNECTIONS = 64
+MAX_KEEPALIVE_CONNECTIONS = 32
+
+# Same retry behaviour as the sync transport: exponential backoff on
+# connection errors and 429/5xx, honouring Retry-After.
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# httpx clients are bound to the event loop they were created on, so keep
+# one per loop and let it go away with the loop.
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """Return the shared httpx.AsyncClient for the running event loop."""
+    # Imported here so the sync code paths never pay for httpx.
+    import asyncio
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        connect, read = transport.DEFAULT_TIMEOUT
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def aclose() -> None:
+    """Close the running loop's client, e.g. when a server shuts down."""
+    import asyncio
+
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        from email.utils import parsedate_to_datetime
+
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, seconds), transport.MAX_RETRY_AFTER)
+
+
+async def request(method: str, url: str, **kwargs):
+    """
+    Send a request through the shared client, retrying like the sync
+    transport. The last response is returned even if its status is an error;
+    the last connection error is raised if every attempt failed.
+    """
+    import asyncio
+    import httpx
+
+    client = get_client()
+    start = time.perf_counter()
+    for attempt in range(RETRIES + 1):
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            if attempt == RETRIES:
+                raise
+            await asyncio.sleep(BACKOFF_FACTOR * (2 ** attempt))
+            continue
+
+        if response.status_code not in RETRY_STATUSES or attempt == RETRIES:
+            # Like the sync stats, latency covers all attempts.
+            elapsed = time.perf_counter() - start
+            transport.record_latency(str(response.url), elapsed, response.status_code)
+            if trace.enabled():
+                trace.event(f"http {response.url.host}", elapsed, method=method, path=response.url.path,
+                            status=response.status_code, bytes=len(response.content), retries=attempt)
+            return response
+        delay = _retry_after(response)
+        await asyncio.sleep(delay if delay is not None else BACKOFF_FACTOR * (2 ** attempt))
+
+
+async def get(url: str, **kwargs):
+    return await request("GET", url, **kwargs)
+
+
+async def post(url: str, **kwargs):
+    return await request("POST", url, **kwargs)
@@ -0,0 +1,203 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from api import config, trace
+
+# Where the on-disk caches live. Set LYRINGO_CACHE_DIR to move them, or to an
+# empty string to keep everything in memory only.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "lyringo")
+DB_FILENAME = "cache.sqlite3"
+
+# Only check the row count against `max_entries` every this many writes.
+_EVICT_EVERY = 64
+
+
+def cache_dir() -> Optional[str]:
+    path = config.get("LYRINGO_CACHE_DIR", DEFAULT_CACHE_DIR)
+    return path or None
+
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def _connect(path: str):
+    """
+    Return one shared sqlite connection (and its lock) per database file.
+    All caches live in the same file, each in its own namespace.
+    """
+    with _connections_lock:
+        if path not in _connections:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires REAL, accessed REAL NOT NULL,"
+                " PRIMARY KEY (ns, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (ns, accessed)")
+            _connections[path] = (conn, threading.Lock())
+        return _connections[path]
+
+
+class PersistentCache:
+    """
+    A small key/value cache: an in-memory LRU in front of an SQLite table.
+
+    Values must be JSON serializable. Entries expire after `ttl` seconds
+    (None means never) and the on-disk table is trimmed to `max_entries` by
+    evicting the least recently used rows. If the database can't be opened
+    the cache silently works in memory only. The database is opened on first
+    use, so creating a cache at import time reads no settings and touches no
+    files.
+    """
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None, max_entries: int = 10000,
+                 memory_entries: int = 1024, path: Optional[str] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._path = path
+        self._db = None
+        self._opened = False
+
+    def _database(self):
+        # (connection, lock), or None when the cache is memory only.
+        if not self._opened:
+            with self._lock:
+                if not self._opened:
+                    path = self._path
+                    if path is None:
+                        directory = cache_dir()
+                        path = os.path.join(directory, DB_FILENAME) if directory else None
+                    if path:
+                        try:
+                            self._db = _connect(path)
+                        except (OSError, sqlite3.Error):
+                            self._db = None
+                    self._opened = True
+        return self._db
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    trace.count("cache_hits")
+                    return value
+                del self._memory[key]
+
+        row = None
+        db = self._database()
+        if db:
+            conn, db_lock = db
+            try:
+                with db_lock:
+                    row = conn.execute(
+                        "SELECT value, expires FROM entries WHERE ns = ? AND key = ?",
+                        (self.namespace, key),
+                    ).fetchone()
+                    if row and row[1] is not None and row[1] <= now:
+                        conn.execute("DELETE FROM entries WHERE ns = ? AND key = ?", (self.namespace, key))
+                        row = None
+                    elif row:
+                        conn.execute(
+                            "UPDATE entries SET accessed = ? WHERE ns = ? AND key = ?",
+                            (now, self.namespace, key),
+                        )
+            except sqlite3.Error:
+                row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                trace.count("cache_misses")
+                return default
+            self.hits += 1
+            trace.count("cache_hits")
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+        with self._lock:
+            self._remember(key, value, expires)
+            self._writes += 1
+            evict = self._writes % _EVICT_EVERY == 0
+
+        db = self._database()
+        if not db:
+            return
+        conn, db_lock = db
+        try:
+            with db_lock:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (ns, key, value, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value), expires, now),
+                )
+                if evict:
+                    self._evict(conn, now)
+        except (sqlite3.Error, TypeError, ValueError):
+            # Not serializable or the disk is unhappy; the memory copy still works.
+            pass
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+        db = self._database()
+        if db:
+            conn, db_lock = db
+            with db_lock:
+                conn.execute("DELETE FROM entries WHERE ns = ? AND key = ?", (self.namespace, key))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self.hits = 0
+            self.misses = 0
+        db = self._database()
+        if db:
+            conn, db_lock = db
+            with db_lock:
+                conn.execute("DELETE FROM entries WHERE ns = ?", (self.namespace,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
+
+    def _remember(self, key, value, expires):
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM entries WHERE ns = ? AND expires IS NOT NULL AND expires <= ?", (self.namespace, now))
+        (count,) = conn.execute("SELECT COUNT(*) FROM entries WHERE ns = ?", (self.namespace,)).fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM entries WHERE ns = ? AND key IN ("
+                " SELECT key FROM entries WHERE ns = ? ORDER BY accessed LIMIT ?)",
+                (self.namespace, self.namespace, count - self.max_entries),
+            )
@@ -0,0 +1,30 @@
+import os
+import threading
+from typing import Optional
+
+# Settings (API credentials, LYRINGO_* options) come from the environment,
+# with a .env file in the working directory filling in anything unset. The
+# file is read once per process, on the first lookup. Nothing looks a
+# setting up at import time (caches open their database and tracing reads
+# LYRINGO_TRACE on first use), so importing the api modules doesn't touch
+# the disk or pull in python-dotenv.
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def load() -> None:
+    """Read .env into the environment if that hasn't happened yet."""
+    global _loaded
+    if _loaded:
+        return
+    with _load_lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            _loaded = True
+
+
+def get(name: str, default: Optional[str] = None) -> Optional[str]:
+    load()
+    return os.getenv(name, default)
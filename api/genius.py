@@ -1,87 +1,302 @@
-import lyricsgenius
-import os 
 import re
-from dotenv import load_dotenv
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
 
-load_dotenv()
-token = os.getenv("GENIUS_ACCESS_TOKEN")
-genius = lyricsgenius.Genius(token, verbose=False)
+from api import async_transport, config, langid, trace, transport
+from api import lyrics as lyrics_text
+from api.lyrics import Lyrics
+from api.cache import PersistentCache
+
+# The lyricsgenius client is built on first use: importing lyricsgenius pulls
+# in bs4 and most of requests, which is most of Lyringo's start-up time, and
+# the game shows its menu long before it needs Genius.
+_genius = None
+_genius_lock = threading.Lock()
+
+
+def get_genius():
+    """Return the shared lyricsgenius client, creating it on first call."""
+    global _genius
+    if _genius is None:
+        with _genius_lock:
+            if _genius is None:
+                import lyricsgenius
+
+                # lyricsgenius sleeps `sleep_time` after every request as crude
+                # rate limiting. The shared transport already backs off on
+                # 429/Retry-After, so skip it.
+                client = lyricsgenius.Genius(config.get("GENIUS_ACCESS_TOKEN"), verbose=False, sleep_time=0)
+                transport.configure(client._session)
+                _genius = client
+    return _genius
+
+
+def __getattr__(name):
+    # `genius_client.genius` keeps working, it just builds the client lazily.
+    if name == "genius":
+        return get_genius()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Cleaned lyrics (Lyrics.to_dict(), or {} if the song wasn't found) keyed by
+# normalized (title, artist). Songs that weren't found or have no lyrics are
+# cached too, but for a shorter time in case Genius adds them later.
+LYRICS_TTL = 30 * 24 * 3600
+NO_LYRICS_TTL = 24 * 3600
+cache = PersistentCache("songs", ttl=LYRICS_TTL, max_entries=5000, memory_entries=256)
+
+# How many playlist candidates are searched on Genius at the same time.
+PROBE_WORKERS = 4
 
 def clean_lyrics(lyrics):
+    # Section tags, parentheticals, the Genius prelude and footers are
+    # stripped in one pass; see api/lyrics.py.
+    return lyrics_text.clean(lyrics)[0]
+
+
+def _cache_key(song_title, artist):
+    title = " ".join((song_title or "").casefold().split())
+    artist = " ".join((artist or "").casefold().split())
+    return f"{title}\x1f{artist}"
+
+def _cached(key):
+    """Return (hit, lyrics): the cached Lyrics, or None for a song known to be missing."""
+    cached = cache.get(key)
+    if cached is None:
+        return False, None
+    return True, (Lyrics.from_dict(cached) if cached else None)
+
+def _store(key, lyrics):
+    # A missing song or an empty body is a "negative" result.
+    ttl = LYRICS_TTL if has_lyrics(lyrics) else NO_LYRICS_TTL
+    cache.set(key, lyrics.to_dict() if lyrics else {}, ttl=ttl)
+
+# Look up a song's lyrics by title and artist. Returns a Lyrics object (with
+# no lines if the song has no lyrics) or None if the song wasn't found.
+@trace.traced("genius.get_song")
+def get_song(song_title, artist):
+    key = _cache_key(song_title, artist)
+    hit, lyrics = _cached(key)
+    if hit:
+        return lyrics
+
+    lyrics = _search_song(song_title, artist)
+    _store(key, lyrics)
+    return lyrics
+
+def _as_lyrics_info(lyrics):
     if not lyrics:
-        return ""
-    # Remove lines that are only [bracketed] or (parenthetical)
-    lyrics = re.sub(r'^\s*\[.*?\]\s*$','', lyrics, flags=re.MULTILINE)
-    lyrics = re.sub(r'^\s*\(.*?\)\s*$','', lyrics, flags=re.MULTILINE)
-    # Remove common footer markers if still present
-    for marker in ["You might also like", "Embed"]:
-        if marker in lyrics:
-            lyrics = lyrics.split(marker)[0]
-    # Collapse multiple blank lines to a single blank line
-    lyrics = re.sub(r'\n\s*\n+', '\n\n', lyrics)
-    return lyrics.strip()
-
-
-# Look up lyrics for a given artist and song
+        return {"formatted": None, "language": None}
+    return {"formatted": lyrics.formatted, "language": lyrics.language}
+
+# Look up lyrics for a given artist and song, as a dict with the keys
+# 'formatted' ("Title — Artist" header and lyrics) and 'language'.
 def get_song_lyrics(song_title, artist):
-    song = genius.search_song(song_title, artist)
+    return _as_lyrics_info(get_song(song_title, artist))
+
+def has_lyrics(lyrics):
+    if isinstance(lyrics, Lyrics):
+        return lyrics.has_lyrics
+    formatted = lyrics.get("formatted") if isinstance(lyrics, dict) else lyrics
+    _, body = lyrics_text.split_formatted(formatted or "")
+    return bool(body)
+
+def _song_query(song):
+    # (title, artist) to search for a playlist track; Genius knows songs
+    # under their first artist.
+    artists = song.get("artist_names") or []
+    return song.get("track_name"), artists[0] if artists else ""
+
+def _no_winner(errors, candidates):
+    # If every candidate failed with an error, raise the first one so the
+    # caller can report network problems.
+    if len(errors) == len(candidates):
+        raise errors[0]
+    return None, None
+
+# Search several candidate songs ({"track_name", "artist_names"} dicts) at once
+# and return (song, Lyrics) for the first one that has lyrics, or
+# (None, None) if none of them do. Searches still queued are cancelled once a
+# winner is found. If every candidate failed with an error, the first error is
+# raised so the caller can report network problems.
+@trace.traced("genius.find_song_with_lyrics")
+def find_song_with_lyrics(candidates, max_workers=PROBE_WORKERS, on_result=None):
+    if not candidates:
+        return None, None
+
+    def probe(song):
+        lyrics = get_song(*_song_query(song))
+        # Report every finished search, including those that complete after
+        # another candidate already won (e.g. to the lyrics index).
+        if on_result is not None:
+            on_result(song, lyrics)
+        return lyrics
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(candidates)), thread_name_prefix="lyringo-probe")
+    probe = trace.propagate(probe)
+    futures = {executor.submit(probe, song): song for song in candidates}
+    errors = []
+    try:
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    lyrics = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if has_lyrics(lyrics):
+                    return futures[future], lyrics
+    finally:
+        # Searches already running finish in the background (and still fill
+        # the lyrics cache); queued ones are dropped.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return _no_winner(errors, candidates)
+
+def _with_language(lyrics: Lyrics) -> Lyrics:
+    # Genius has no reliable language field, so tell it from the lyrics.
+    lyrics.language = langid.detect(lyrics.lines)
+    return lyrics
+
+@trace.traced("genius.search_song")
+def _search_song(song_title, artist):
+    # The full song info would only add the language, which is detected
+    # from the lyrics instead; skipping it saves an API call per song.
+    song = get_genius().search_song(song_title, artist, get_full_info=False)
 
     if not song:
-        return {"formatted": None, "language": None}
+        return None
     
     # Use the song object's metadata when available
     title = getattr(song, "title", song_title) or song_title
     artist_name = getattr(song, "artist", artist) or artist
     lyrics = getattr(song, "lyrics", "") or ""
 
-    # Clean up footer noise
-    lyrics = lyrics.strip()
-    lyrics = clean_lyrics(lyrics)
-
-    # Nicely formatted output
-    formatted = f"{title} — {artist_name}\n" + "-" * (len(title) + 3 + len(artist_name)) + "\n\n" + lyrics
-    # Try to extract a language field from the song object if present. The
-    # lyricsgenius Song object varies across versions; check a few likely
-    # attribute names and also inspect internal dicts if available.
-    language = None
-    # common attribute names on Song objects
-    for attr in ("language", "primary_language", "language_code", "lyrics_language", "lang"):
-        try:
-            val = getattr(song, attr, None)
-        except Exception:
-            val = None
-        if val:
-            language = val
-            break
-
-    # fallback: inspect internals (some Song implementations expose a _body or __dict__)
-    if not language:
-        try:
-            body = None
-            if hasattr(song, "_body") and isinstance(getattr(song, "_body"), dict):
-                body = getattr(song, "_body")
-            elif hasattr(song, "__dict__"):
-                # sometimes the raw JSON is stored in an attribute like _json or _body
-                d = getattr(song, "__dict__")
-                # look for common container names
-                for key in ("_body", "_json", "_response", "body"):
-                    if key in d and isinstance(d[key], dict):
-                        body = d[key]
-                        break
-
-            if isinstance(body, dict):
-                for key in ("language", "lang", "language_code"):
-                    if key in body and body.get(key):
-                        language = body.get(key)
-                        break
-                # lastly, try any value whose key contains 'lang'
-                if not language:
-                    for k, v in body.items():
-                        if "lang" in k.lower() and v:
-                            language = v
-                            break
-        except Exception:
-            # ignore extraction errors and leave language as None
-            pass
-
-    return {"formatted": formatted, "language": language}
+    return _with_language(Lyrics.from_raw(title, artist_name, lyrics))
+
+
+# Async lookups talk to Genius directly (lyricsgenius is blocking): the public
+# search endpoint and the song page for the lyrics themselves, following what
+# `genius.search_song` does.
+GENIUS_WEB_URL = "https://genius.com"
+
+def _pick_song_hit(response, song_title):
+    """Prefer a song hit whose title matches, else the first song hit."""
+    hits = [hit for section in response.get("sections", []) for hit in section.get("hits", [])
+            if hit.get("index") == "song"]
+    from lyricsgenius.utils import clean_str
+
+    wanted = clean_str(song_title or "")
+    for hit in hits:
+        if clean_str(hit["result"].get("title") or "") == wanted:
+            return hit["result"]
+    return hits[0]["result"] if hits else None
+
+_LYRICS_HEADER_CLASS = re.compile("LyricsHeader")
+
+@trace.traced("genius.scrape_lyrics")
+def _lyrics_from_html(html):
+    # bs4 is only needed here, so don't import it for every sync lookup.
+    from bs4 import BeautifulSoup, NavigableString
+
+    soup = BeautifulSoup(html, "html.parser")
+    for header in soup.find_all("div", class_=_LYRICS_HEADER_CLASS):
+        header.decompose()
+
+    lyrics = ""
+    for container in soup.find_all("div", attrs={"data-lyrics-container": "true"}):
+        if not container.contents:
+            lyrics += "\n"
+            continue
+        for element in container.contents:
+            if element.name == "br":
+                lyrics += "\n"
+            elif isinstance(element, NavigableString):
+                lyrics += str(element)
+            elif element.get("data-exclude-from-selection") != "true":
+                lyrics += element.get_text(separator="\n")
+    return lyrics.strip("\n")
+
+@trace.traced("genius.search_song")
+async def _asearch_song(song_title, artist):
+    search_term = f"{song_title} {artist}".strip() if artist else f"{song_title}".strip()
+    resp = await async_transport.get(f"{GENIUS_WEB_URL}/api/search/multi", params={"q": search_term})
+    resp.raise_for_status()
+    song_info = _pick_song_hit(resp.json().get("response", {}), song_title)
+    if not song_info:
+        return None
+    # Reject the same hits lyricsgenius' search_song does, with the shared
+    # client's settings: unfinished or instrumental lyrics, and titles with
+    # an excluded term such as "(Tracklist)" or "[Credits]".
+    client = get_genius()
+    if client.skip_non_songs and not client._result_is_lyrics(song_info):
+        return None
+    title = song_info.get("title") or song_title
+    artist_name = (song_info.get("primary_artist") or {}).get("name") or artist
+    raw = ""
+    if song_info.get("lyrics_state") == "complete" and not song_info.get("instrumental"):
+        page_path = urlsplit(song_info.get("url") or "").path
+        page_resp = await async_transport.get(f"{GENIUS_WEB_URL}{page_path}")
+        page_resp.raise_for_status()
+        raw = _lyrics_from_html(page_resp.text)
+    if client.skip_non_songs and not raw:
+        return None
+    return _with_language(Lyrics.from_raw(title, artist_name, raw))
+
+@trace.traced("genius.get_song")
+async def aget_song(song_title, artist):
+    """
+    Async variant of `get_song`, sharing its cache.
+    """
+    key = _cache_key(song_title, artist)
+    hit, lyrics = _cached(key)
+    if hit:
+        return lyrics
+
+    lyrics = await _asearch_song(song_title, artist)
+    _store(key, lyrics)
+    return lyrics
+
+async def aget_song_lyrics(song_title, artist):
+    """
+    Async variant of `get_song_lyrics`, sharing its cache and result shape.
+    """
+    return _as_lyrics_info(await aget_song(song_title, artist))
+
+@trace.traced("genius.find_song_with_lyrics")
+async def afind_song_with_lyrics(candidates, on_result=None):
+    """
+    Async variant of `find_song_with_lyrics`: all candidates are searched at
+    once and the rest are cancelled as soon as one has lyrics.
+    """
+    import asyncio
+
+    if not candidates:
+        return None, None
+
+    async def probe(song):
+        lyrics = await aget_song(*_song_query(song))
+        if on_result is not None:
+            on_result(song, lyrics)
+        return song, lyrics
+
+    pending = {asyncio.ensure_future(probe(song)) for song in candidates}
+    errors = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    song, lyrics = task.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if has_lyrics(lyrics):
+                    return song, lyrics
+    finally:
+        for task in pending:
+            task.cancel()
+
+    return _no_winner(errors, candidates)
@@ -0,0 +1,334 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# Offline language identification for lyrics, so nothing has to be sent to
+# Google just to learn what language a song is in.
+#
+# Scripts with one language of their own are decided by counting
+# characters: kana means Japanese, hangul Korean, and so on. Text in Latin or
+# Cyrillic letters is scored against character-trigram profiles built from
+# the short seed texts below, on first use, into one table that maps a
+# trigram to its per-language log-probabilities.
+
+# A few hundred words of everyday and song-like sentences per language,
+# written for this table. More text gives sharper profiles.
+SEED_TEXTS = {
+    "en": """
+        I walked along the river when the night was cold and quiet, thinking about
+        the words you never said. The city lights were shining on the water and
+        somebody was singing in a window high above the street. We used to run
+        through the rain without a care, laughing like the world would always wait
+        for us. Now the morning comes too early and my heart is learning how to
+        let you go. Hold my hand and tell me that everything will be alright, tell
+        me that the summer is still ours. There is a song that plays whenever I
+        remember your face, and it never sounds the same. Where did all the time
+        go, why does the road feel longer every day? I would give anything to hear
+        your voice again, just one more time before the light goes out.
+    """,
+    "es": """
+        Caminaba por la orilla del mar cuando la noche era fría y tranquila,
+        pensando en las palabras que nunca dijiste. Las luces de la ciudad
+        brillaban sobre el agua y alguien cantaba en una ventana de la calle.
+        Corríamos bajo la lluvia sin ninguna preocupación, riendo como si el mundo
+        siempre nos fuera a esperar. Ahora la mañana llega demasiado pronto y mi
+        corazón está aprendiendo a dejarte ir. Dame la mano y dime que todo va a
+        estar bien, dime que el verano todavía es nuestro. Hay una canción que
+        suena cada vez que recuerdo tu cara, y nunca es igual. ¿Dónde se fue todo
+        el tiempo, por qué el camino parece más largo cada día? Daría cualquier
+        cosa por escuchar tu voz otra vez, solo una vez más antes de que se apague
+        la luz.
+    """,
+    "fr": """
+        Je marchais le long de la rivière quand la nuit était froide et calme, en
+        pensant aux mots que tu n'as jamais dits. Les lumières de la ville
+        brillaient sur l'eau et quelqu'un chantait à une fenêtre au-dessus de la
+        rue. Nous courions sous la pluie sans aucun souci, en riant comme si le
+        monde allait toujours nous attendre. Maintenant le matin arrive trop tôt
+        et mon cœur apprend à te laisser partir. Prends ma main et dis-moi que tout
+        ira bien, dis-moi que l'été est encore à nous. Il y a une chanson qui joue
+        chaque fois que je me souviens de ton visage, et elle n'est jamais pareille.
+        Où est passé tout ce temps, pourquoi la route semble-t-elle plus longue
+        chaque jour? Je donnerais n'importe quoi pour entendre encore ta voix.
+    """,
+    "de": """
+        Ich ging am Fluss entlang, als die Nacht kalt und still war, und dachte an
+        die Worte, die du nie gesagt hast. Die Lichter der Stadt glänzten auf dem
+        Wasser und jemand sang an einem Fenster hoch über der Straße. Wir liefen
+        ohne Sorgen durch den Regen und lachten, als würde die Welt immer auf uns
+        warten. Jetzt kommt der Morgen viel zu früh und mein Herz lernt, dich gehen
+        zu lassen. Halt meine Hand und sag mir, dass alles gut wird, sag mir, dass
+        der Sommer noch uns gehört. Es gibt ein Lied, das immer spielt, wenn ich
+        mich an dein Gesicht erinnere, und es klingt nie gleich. Wohin ist die
+        ganze Zeit gegangen, warum wird der Weg jeden Tag länger? Ich würde alles
+        geben, um deine Stimme noch einmal zu hören.
+    """,
+    "it": """
+        Camminavo lungo il fiume quando la notte era fredda e tranquilla, pensando
+        alle parole che non hai mai detto. Le luci della città brillavano
+        sull'acqua e qualcuno cantava da una finestra sopra la strada. Correvamo
+        sotto la pioggia senza pensieri, ridendo come se il mondo ci avrebbe sempre
+        aspettato. Adesso il mattino arriva troppo presto e il mio cuore sta
+        imparando a lasciarti andare. Prendi la mia mano e dimmi che andrà tutto
+        bene, dimmi che l'estate è ancora nostra. C'è una canzone che suona ogni
+        volta che ricordo il tuo viso, e non è mai la stessa. Dove è finito tutto
+        il tempo, perché la strada sembra più lunga ogni giorno? Darei qualsiasi
+        cosa per sentire ancora la tua voce, soltanto un'altra volta.
+    """,
+    "pt": """
+        Eu caminhava pela margem do rio quando a noite estava fria e calma,
+        pensando nas palavras que você nunca disse. As luzes da cidade brilhavam
+        sobre a água e alguém cantava numa janela acima da rua. Nós corríamos na
+        chuva sem nenhuma preocupação, rindo como se o mundo fosse sempre esperar
+        por nós. Agora a manhã chega cedo demais e o meu coração está aprendendo a
+        deixar você ir. Segura a minha mão e diz que tudo vai ficar bem, diz que o
+        verão ainda é nosso. Tem uma canção que toca sempre que eu lembro do seu
+        rosto, e ela nunca soa igual. Para onde foi todo o tempo, por que o caminho
+        parece mais longo a cada dia? Eu daria qualquer coisa para ouvir a sua voz
+        de novo, só mais uma vez antes que a luz se apague.
+    """,
+    "sv": """
+        Jag gick längs älven när natten var kall och stilla och tänkte på orden
+        som du aldrig sa. Stadens ljus glittrade på vattnet och någon sjöng i ett
+        fönster högt ovanför gatan. Vi sprang genom regnet utan att bry oss och
+        skrattade som om världen alltid skulle vänta på oss. Nu kommer morgonen
+        alldeles för tidigt och mitt hjärta lär sig att låta dig gå. Håll min hand
+        och säg att allting ska bli bra, säg att sommaren fortfarande är vår. Det
+        finns en sång som spelas varje gång jag minns ditt ansikte, och den låter
+        aldrig likadant. Vart tog all tid vägen, varför känns vägen längre för
+        varje dag? Jag skulle ge vad som helst för att höra din röst igen, bara en
+        gång till innan ljuset slocknar.
+    """,
+    "da": """
+        Jeg gik langs åen da natten var kold og stille og tænkte på de ord, du
+        aldrig sagde. Byens lys skinnede på vandet, og nogen sang i et vindue højt
+        oppe over gaden. Vi løb gennem regnen uden at bekymre os og grinede, som om
+        verden altid ville vente på os. Nu kommer morgenen alt for tidligt, og mit
+        hjerte lærer at give slip på dig. Hold min hånd og sig, at det hele nok
+        skal gå, sig at sommeren stadig er vores. Der er en sang, der spiller hver
+        gang jeg husker dit ansigt, og den lyder aldrig ens. Hvor blev al tiden af,
+        hvorfor føles vejen længere for hver dag? Jeg ville give hvad som helst for
+        at høre din stemme igen, bare én gang til, før lyset går ud. Du sagde til
+        mig, at vi havde meget mere tid, men jeg kan ikke se hvad der bliver af os
+        efter i aften. Skal vi danse en sidste gang og glemme alt det andet? Hun
+        sagde, at hun ville komme tilbage, men dagene går, og intet sker. Jeg
+        sidder her alene og venter, mens regnen falder mod mit vindue, og ingen
+        andre ved, hvordan det føles at miste alt, man har.
+    """,
+    "no": """
+        Jeg gikk langs elva da natta var kald og stille og tenkte på ordene du
+        aldri sa. Lysene fra byen glitret på vannet, og noen sang i et vindu høyt
+        over gata. Vi løp gjennom regnet uten å bry oss og lo som om verden alltid
+        skulle vente på oss. Nå kommer morgenen altfor tidlig, og hjertet mitt
+        lærer seg å gi slipp på deg. Hold hånda mi og si at alt skal gå bra, si at
+        sommeren fortsatt er vår. Det finnes en sang som spilles hver gang jeg
+        husker ansiktet ditt, og den høres aldri lik ut. Hvor ble det av all tida,
+        hvorfor føles veien lengre for hver dag? Jeg ville gitt hva som helst for å
+        høre stemmen din igjen, bare én gang til før lyset slukner. Du sa til meg
+        at vi hadde mye mer tid, men jeg kan ikke se hva som blir av oss etter i
+        kveld. Skal vi danse en siste gang og glemme alt det andre? Hun sa at hun
+        ville komme tilbake, men dagene går og ingenting skjer. Jeg sitter her
+        alene og venter mens regnet faller mot vinduet mitt, og ingen andre vet
+        hvordan det føles å miste alt man har.
+    """,
+    "nl": """
+        Ik liep langs de rivier toen de nacht koud en stil was en dacht aan de
+        woorden die je nooit hebt gezegd. De lichten van de stad schenen op het
+        water en iemand zong voor een raam hoog boven de straat. We renden zonder
+        zorgen door de regen en lachten alsof de wereld altijd op ons zou wachten.
+        Nu komt de ochtend veel te vroeg en leert mijn hart je los te laten. Houd
+        mijn hand vast en zeg dat alles goed komt, zeg dat de zomer nog steeds van
+        ons is. Er is een lied dat speelt telkens als ik aan je gezicht denk, en
+        het klinkt nooit hetzelfde. Waar is al die tijd gebleven, waarom voelt de
+        weg elke dag langer? Ik zou alles geven om je stem nog eens te horen, nog
+        één keer voordat het licht uitgaat.
+    """,
+    "fi": """
+        Kävelin joen rantaa, kun yö oli kylmä ja hiljainen, ja ajattelin sanoja,
+        joita et koskaan sanonut. Kaupungin valot kimaltelivat vedessä ja joku
+        lauloi ikkunassa korkealla kadun yllä. Juoksimme sateessa huolettomina ja
+        nauroimme kuin maailma odottaisi meitä aina. Nyt aamu tulee liian aikaisin
+        ja sydämeni opettelee päästämään sinusta irti. Pidä minua kädestä ja sano,
+        että kaikki järjestyy, sano että kesä on vielä meidän. On laulu, joka soi
+        aina kun muistan kasvosi, eikä se koskaan kuulosta samalta. Minne kaikki
+        aika katosi, miksi tie tuntuu joka päivä pidemmältä? Antaisin mitä tahansa
+        kuullakseni äänesi vielä kerran, ennen kuin valo sammuu.
+    """,
+    "pl": """
+        Szedłem wzdłuż rzeki, kiedy noc była zimna i cicha, i myślałem o słowach,
+        których nigdy nie powiedziałaś. Światła miasta lśniły na wodzie, a ktoś
+        śpiewał w oknie wysoko nad ulicą. Biegaliśmy w deszczu bez żadnych
+        zmartwień i śmialiśmy się, jakby świat zawsze miał na nas czekać. Teraz
+        poranek przychodzi za wcześnie, a moje serce uczy się pozwolić ci odejść.
+        Weź mnie za rękę i powiedz, że wszystko będzie dobrze, powiedz, że lato
+        wciąż jest nasze. Jest piosenka, która gra za każdym razem, gdy wspominam
+        twoją twarz, i nigdy nie brzmi tak samo. Gdzie podział się cały ten czas,
+        dlaczego droga wydaje się dłuższa każdego dnia? Oddałbym wszystko, żeby
+        jeszcze raz usłyszeć twój głos.
+    """,
+    "tr": """
+        Gece soğuk ve sessizken nehrin kıyısında yürüyordum ve hiç söylemediğin
+        sözleri düşünüyordum. Şehrin ışıkları suyun üstünde parlıyordu ve biri
+        sokağın yukarısındaki bir pencerede şarkı söylüyordu. Yağmurun altında hiç
+        dert etmeden koşar, dünya bizi hep bekleyecekmiş gibi gülerdik. Şimdi sabah
+        çok erken geliyor ve kalbim seni bırakmayı öğreniyor. Elimi tut ve bana her
+        şeyin yoluna gireceğini söyle, yazın hâlâ bizim olduğunu söyle. Yüzünü her
+        hatırladığımda çalan bir şarkı var ve hiçbir zaman aynı gelmiyor. Bütün o
+        zaman nereye gitti, yol neden her gün daha uzun geliyor? Sesini bir kez
+        daha duymak için her şeyimi verirdim, ışık sönmeden önce sadece bir kez.
+    """,
+    "ru": """
+        Я шёл вдоль реки, когда ночь была холодной и тихой, и думал о словах,
+        которые ты так и не сказала. Огни города сверкали на воде, и кто-то пел в
+        окне высоко над улицей. Мы бегали под дождём без всяких забот и смеялись,
+        как будто мир всегда будет нас ждать. Теперь утро приходит слишком рано, и
+        моё сердце учится отпускать тебя. Возьми меня за руку и скажи, что всё
+        будет хорошо, скажи, что лето всё ещё наше. Есть песня, которая звучит
+        каждый раз, когда я вспоминаю твоё лицо, и она никогда не звучит так же.
+        Куда ушло всё это время, почему дорога с каждым днём кажется длиннее? Я
+        отдал бы всё, чтобы услышать твой голос ещё один раз. Она сказала, что
+        вернётся, но дни проходят, и ничего не меняется. Я сижу здесь один и жду,
+        пока дождь стучит в моё окно, и никто не знает, как это больно, когда
+        теряешь всё, что у тебя было. Не уходи, останься со мной до утра.
+    """,
+    "uk": """
+        Я йшов уздовж річки, коли ніч була холодна й тиха, і думав про слова, які
+        ти так і не сказала. Вогні міста виблискували на воді, і хтось співав у
+        вікні високо над вулицею. Ми бігали під дощем без жодних турбот і
+        сміялися, ніби світ завжди чекатиме на нас. Тепер ранок приходить надто
+        рано, і моє серце вчиться відпускати тебе. Візьми мене за руку і скажи, що
+        все буде добре, скажи, що літо ще наше. Є пісня, яка лунає щоразу, коли я
+        згадую твоє обличчя, і вона ніколи не звучить однаково. Куди подівся весь
+        цей час, чому дорога щодня здається довшою? Я віддав би все, щоб почути
+        твій голос ще хоч раз. Вона сказала, що повернеться, але дні минають, і
+        нічого не змінюється. Я сиджу тут сам і чекаю, поки дощ стукає у моє
+        вікно, і ніхто не знає, як це боляче, коли втрачаєш усе, що мав. Не йди,
+        залишся зі мною до ранку.
+    """,
+}
+
+# Trigrams kept per language, and the log-probability given to a trigram a
+# language's profile doesn't have.
+PROFILE_SIZE = 400
+_UNSEEN = math.log(1e-5)
+# Only this much of a song is looked at; a few verses are plenty.
+SAMPLE_CHARS = 600
+# Fewer known trigrams than this and the text is too short to tell.
+MIN_TRIGRAMS = 12
+
+# How well the best language must fit, as (coverage, fit, margin) over the
+# sample's trigrams: the share any profile knows, the best language's mean
+# score, and how far that is ahead of the runner-up's. Text in a language
+# without a profile (Catalan, Bulgarian, Croatian...) fits poorly overall or
+# about as well as a neighbour, and gets None.
+THRESHOLDS = (0.5, 2.5, 0.2)
+# Used by `detect(..., strict=True)` where a wrong answer costs more than
+# none, e.g. when deciding that a song needs no translating.
+STRICT_THRESHOLDS = (0.55, 3.0, 0.35)
+
+_NON_LETTERS = re.compile(r"[\W\d_]+")
+
+# Unicode blocks of scripts other than Latin and Cyrillic.
+_SCRIPT_RANGES = (
+    (0x3040, 0x30FF, "kana"),
+    (0x31F0, 0x31FF, "kana"),
+    (0xAC00, 0xD7AF, "hangul"),
+    (0x1100, 0x11FF, "hangul"),
+    (0x3130, 0x318F, "hangul"),
+    (0x4E00, 0x9FFF, "han"),
+    (0x3400, 0x4DBF, "han"),
+    (0x0370, 0x03FF, "greek"),
+    (0x0590, 0x05FF, "hebrew"),
+    (0x0600, 0x06FF, "arabic"),
+    (0x0900, 0x097F, "devanagari"),
+    (0x0E00, 0x0E7F, "thai"),
+)
+# Scripts that settle the language on their own. The others are shared:
+# Han without kana may be Chinese (either script) or Japanese, Arabic script
+# also writes Persian and Urdu, Devanagari Marathi and Nepali, and Hebrew
+# script Yiddish, so text in them is left undetected.
+_SCRIPT_LANGUAGE = {"kana": "ja", "hangul": "ko", "greek": "el", "thai": "th"}
+
+
+def _words(text: str) -> List[str]:
+    return _NON_LETTERS.sub(" ", text.casefold()).split()
+
+
+def _trigrams(text: str) -> Iterable[str]:
+    for word in _words(text):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            yield padded[i:i + 3]
+
+
+@lru_cache(maxsize=1)
+def _table() -> Tuple[Tuple[str, ...], Dict[str, Tuple[float, ...]]]:
+    """
+    (languages, {trigram: per-language score}). A score is the trigram's
+    log-probability in that language minus _UNSEEN, so trigrams a language
+    lacks add 0 and trigrams no language has can be skipped.
+    """
+    languages = tuple(SEED_TEXTS)
+    profiles = []
+    for code in languages:
+        counts = Counter(_trigrams(SEED_TEXTS[code])).most_common(PROFILE_SIZE)
+        total = sum(n for _, n in counts)
+        profiles.append({gram: math.log(n / total) - _UNSEEN for gram, n in counts})
+    grams = set().union(*profiles)
+    return languages, {g: tuple(p.get(g, 0.0) for p in profiles) for g in grams}
+
+
+def _script(text: str) -> Optional[str]:
+    # The script most non-Latin letters are in (kana if there is any, as
+    # Japanese mixes it with Han), if they make up a good share of all the
+    # letters; Cyrillic falls through to the trigram profiles.
+    counts = Counter()
+    letters = 0
+    for ch in text:
+        if not ch.isalpha():
+            continue
+        letters += 1
+        cp = ord(ch)
+        if cp < 0x0370:
+            continue
+        for low, high, script in _SCRIPT_RANGES:
+            if low <= cp <= high:
+                counts[script] += 1
+                break
+    if not counts or sum(counts.values()) < 0.3 * letters:
+        return None
+    if counts["kana"]:
+        return "kana"
+    return counts.most_common(1)[0][0]
+
+
+def detect(text: Union[str, Iterable[str]], strict: bool = False) -> Optional[str]:
+    """
+    The language code (as used by api.translate, e.g. "sv", "ja", "ko") of
+    a text or of a song's lines, or None if there is too little text, it is
+    in a script several languages share, or it doesn't fit any profile well
+    enough (THRESHOLDS, or STRICT_THRESHOLDS with `strict`).
+    """
+    if not isinstance(text, str):
+        text = "\n".join(text)
+    sample = text[:SAMPLE_CHARS]
+    if not sample.isascii():
+        script = _script(sample)
+        if script:
+            return _SCRIPT_LANGUAGE.get(script)
+    languages, table = _table()
+    grams = list(_trigrams(sample))
+    rows = [row for row in map(table.get, grams) if row]
+    if len(rows) < MIN_TRIGRAMS:
+        return None
+    # Summing the columns adds up every language's score in one pass.
+    totals = list(map(sum, zip(*rows)))
+    ranked = sorted(range(len(languages)), key=totals.__getitem__, reverse=True)
+    best, runner_up = totals[ranked[0]], totals[ranked[1]]
+    coverage, fit, margin = STRICT_THRESHOLDS if strict else THRESHOLDS
+    n = len(grams)
+    if len(rows) < coverage * n or best < fit * n or best - runner_up < margin * n:
+        return None
+    return languages[ranked[0]]
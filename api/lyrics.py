@@ -0,0 +1,174 @@
+import re
+from typing import List, Optional, Tuple
+
+from api import trace
+
+# Lines that are only a section tag ("[Chorus]", "[Verse 2: Someone]") or
+# only a parenthetical ("(Instrumental break)") are not sung lyrics. Checked
+# by their first and last character, which is what ^\[.*\]$ amounts to.
+_TAG_ENDS = {"[": "]", "(": ")"}
+# Scraped Genius pages start with "12 ContributorsTranslations...Song Title
+# Lyrics" glued to the first real line.
+_PRELUDE = re.compile(r"\s*\d+\s*Contributors?.*?Lyrics")
+# Genius inserts "You might also like" between lines (glued to a line's end
+# or the next tag) and ends the page with "Embed" glued to the last line,
+# usually after a count: "last line123Embed" or "last lineEmbed". A lyric
+# whose last word is "Embed" has a space before it and is kept.
+_AD = re.compile(r"You might also like(\[[^\]]*\])?")
+_EMBED = re.compile(r"(?:\d+|(?<=\S))Embed$")
+
+
+def _drop_ad(match) -> str:
+    # A tag glued to the ad goes back on a line of its own, so it still
+    # starts a new paragraph.
+    return "\n" + match.group(1) if match.group(1) else ""
+
+
+def _scan(raw: str) -> Tuple[List[str], List[int]]:
+    # One pass over the raw lines: returns the kept lines and the index of
+    # the first line of every paragraph.
+    lines = []
+    starts = []
+    blank = True
+    first = True
+    raw = raw or ""
+    if "You might" in raw:
+        raw = _AD.sub(_drop_ad, raw)
+    for line in raw.splitlines():
+        if first and line.strip():
+            first = False
+            prelude = _PRELUDE.match(line)
+            if prelude:
+                line = line[prelude.end():]
+        line = line.strip()
+        if line and _TAG_ENDS.get(line[0]) == line[-1]:
+            # A removed tag still separates paragraphs, like a blank line.
+            line = ""
+        if not line:
+            blank = True
+            continue
+        if blank:
+            starts.append(len(lines))
+            blank = False
+        lines.append(line)
+
+    if lines:
+        last = _EMBED.sub("", lines[-1]).strip()
+        if last:
+            lines[-1] = last
+        else:
+            lines.pop()
+            if starts[-1] == len(lines):
+                starts.pop()
+    return lines, starts
+
+
+# The "-----" underline under the "Title — Artist" header.
+_RULE_LINE = re.compile(r"^[\-\s]+$")
+
+
+def split_formatted(formatted: str) -> Tuple[str, str]:
+    """
+    Split a "Title — Artist" formatted string (see `Lyrics.formatted`) into
+    (header, body). Text whose first paragraph isn't such a header is all
+    body, with an empty header.
+    """
+    if not formatted:
+        return "", ""
+    parts = formatted.split("\n\n", 1)
+    if len(parts) == 2 and "—" in parts[0]:
+        # The provider may include a decorative underline (e.g. a line of
+        # dashes) directly under the "Title — Artist" line. Remove any
+        # lines that consist only of punctuation/whitespace so the header
+        # becomes just the canonical title/artist string.
+        header_block = parts[0].strip()
+        header_lines = [ln for ln in header_block.splitlines() if not _RULE_LINE.match(ln)]
+        header = header_lines[0].strip() if header_lines else header_block.splitlines()[0].strip()
+        return header, parts[1].strip()
+    return "", formatted.strip()
+
+
+def _join(lines, starts) -> str:
+    bounds = list(starts) + [len(lines)]
+    return "\n\n".join("\n".join(lines[a:b]) for a, b in zip(bounds, bounds[1:]))
+
+
+def clean(raw: str) -> Tuple[str, List[str]]:
+    """
+    Clean scraped lyrics in one pass over the lines. Returns the cleaned
+    text, with paragraphs separated by single blank lines, and the list of
+    its non-empty lines.
+    """
+    lines, starts = _scan(raw)
+    return _join(lines, starts), lines
+
+
+class Lyrics:
+    """
+    A song's cleaned lyrics: title, artist, lyrics language, the lines as a
+    tuple and the index of the first line of each paragraph.
+
+    Built once by the Genius client and passed along as is, so nothing
+    downstream has to parse the "Title — Artist" formatted string again.
+    `to_dict()`/`from_dict()` are what the lyrics cache stores.
+    """
+
+    __slots__ = ("title", "artist", "language", "lines", "paragraphs")
+
+    def __init__(self, title: str, artist: str, lines: Tuple[str, ...] = (),
+                 paragraphs: Tuple[int, ...] = (), language: Optional[str] = None):
+        self.title = title
+        self.artist = artist
+        self.language = language
+        self.lines = tuple(lines)
+        self.paragraphs = tuple(paragraphs) or ((0,) if self.lines else ())
+
+    @classmethod
+    @trace.traced("lyrics.clean")
+    def from_raw(cls, title: str, artist: str, raw: str, language: Optional[str] = None) -> "Lyrics":
+        """Clean scraped lyrics (see `clean`) into a Lyrics object."""
+        lines, starts = _scan(raw)
+        return cls(title, artist, lines, starts, language)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Lyrics":
+        return cls(data["title"], data["artist"], data["lines"], data["paragraphs"], data.get("language"))
+
+    def to_dict(self) -> dict:
+        return {
+            "title": self.title,
+            "artist": self.artist,
+            "language": self.language,
+            "lines": list(self.lines),
+            "paragraphs": list(self.paragraphs),
+        }
+
+    @property
+    def has_lyrics(self) -> bool:
+        return bool(self.lines)
+
+    @property
+    def header(self) -> str:
+        return f"{self.title} — {self.artist}" if self.artist else self.title
+
+    def paragraph_lines(self) -> List[Tuple[str, ...]]:
+        """The lines grouped by paragraph."""
+        bounds = self.paragraphs + (len(self.lines),)
+        return [self.lines[a:b] for a, b in zip(bounds, bounds[1:])]
+
+    @property
+    def text(self) -> str:
+        return _join(self.lines, self.paragraphs)
+
+    @property
+    def formatted(self) -> str:
+        """The "Title — Artist", underline, blank line, lyrics string the game used to pass around."""
+        return f"{self.title} — {self.artist}\n" + "-" * (len(self.title) + 3 + len(self.artist)) + "\n\n" + self.text
+
+    def __eq__(self, other):
+        if not isinstance(other, Lyrics):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"Lyrics({self.title!r}, {self.artist!r}, {len(self.lines)} lines, language={self.language!r})"
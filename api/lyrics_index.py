@@ -0,0 +1,202 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+import api.genius as genius_client
+import api.spotify as spotify_client
+from api import trace
+from api.cache import PersistentCache
+
+# Which tracks of a playlist have lyrics (and in which language), so random
+# picks can skip instrumentals and songs Genius doesn't know. Keyed by
+# playlist id; the value maps a track key to
+#   {"song", "has_lyrics", "language", "checked"}
+# and "probed_at" says when the whole playlist was last checked.
+INDEX_TTL = 90 * 24 * 3600
+index = PersistentCache("lyrics_index", ttl=INDEX_TTL, max_entries=500, memory_entries=32)
+
+# Unknown tracks looked up per background run, and how many at once; kept
+# small so background probing doesn't compete with the game's own searches.
+BACKGROUND_PROBES = 24
+BACKGROUND_WORKERS = 2
+# A playlist whose tracks are all known is checked for new tracks this often.
+REPROBE_AFTER = 3600
+# Known-good tracks are cached, so they win the race for the first song with
+# lyrics. A pick only relies on them alone once there are this many times
+# more of them than it needs; until then most of it is sampled from the
+# playlist, so the first few songs found don't come up in every game.
+GOOD_POOL_FACTOR = 5
+
+_lock = threading.Lock()
+_probing = set()
+
+
+def track_key(song: dict) -> str:
+    artists = ", ".join(song.get("artist_names") or [])
+    return f"{song.get('track_name')}\x1f{artists}".casefold()
+
+
+def _load(playlist_id: str) -> dict:
+    value = index.get(playlist_id)
+    return value if value else {"tracks": {}, "probed_at": 0}
+
+
+def _is_known(entry: dict, now: float) -> bool:
+    # "No lyrics" is rechecked as often as the negative lyrics cache expires.
+    return entry["has_lyrics"] or now - entry["checked"] < genius_client.NO_LYRICS_TTL
+
+
+@trace.traced("lyrics_index.record")
+def record_many(playlist_id: str, rows: Iterable[Tuple[dict, bool, Optional[str]]], keep=None, probed=False) -> None:
+    """
+    Record (song, has_lyrics, language) rows in one write. `keep` is the set
+    of track keys still in the playlist; anything else is dropped.
+    """
+    now = time.time()
+    with _lock:
+        value = _load(playlist_id)
+        tracks = dict(value["tracks"])
+        for song, has_lyrics, language in rows:
+            tracks[track_key(song)] = {
+                "song": {"track_name": song.get("track_name"), "artist_names": song.get("artist_names") or []},
+                "has_lyrics": has_lyrics,
+                "language": language,
+                "checked": now,
+            }
+        if keep is not None:
+            # Forget tracks that were removed from the playlist.
+            tracks = {k: v for k, v in tracks.items() if k in keep}
+        index.set(playlist_id, {"tracks": tracks, "probed_at": now if probed else value["probed_at"]})
+
+
+def record(playlist_id: str, song: dict, has_lyrics: bool, language: Optional[str] = None) -> None:
+    """Remember whether a playlist track has lyrics. Use record_many for batches."""
+    record_many(playlist_id, [(song, has_lyrics, language)])
+
+
+def recorder(playlist_id: str):
+    """
+    An `on_result` callback for `find_song_with_lyrics` that records every
+    probed candidate in the playlist's index.
+    """
+    def on_result(song, lyrics):
+        record(playlist_id, song, genius_client.has_lyrics(lyrics), lyrics.language if lyrics else None)
+    return on_result
+
+
+def known_good(playlist_id: str) -> List[dict]:
+    """The playlist's tracks that are known to have lyrics."""
+    return [e["song"] for e in _load(playlist_id)["tracks"].values() if e["has_lyrics"]]
+
+
+def summary(playlist_id: str) -> dict:
+    entries = _load(playlist_id)["tracks"].values()
+    good = sum(1 for e in entries if e["has_lyrics"])
+    return {"known": len(entries), "with_lyrics": good, "without_lyrics": len(entries) - good}
+
+
+def _lookup(song: dict):
+    artists = song.get("artist_names") or []
+    try:
+        return True, genius_client.get_song(song.get("track_name"), artists[0] if artists else "")
+    except Exception:
+        # Network trouble: leave the track unknown and try another time.
+        return False, None
+
+
+@trace.traced("lyrics_index.probe")
+def _probe_unknown(token, link: str, playlist_id: str, limit: int) -> None:
+    try:
+        # Don't download the whole playlist just to find unknown tracks: use
+        # the cached copy if it is current, otherwise one random page.
+        tracks = spotify_client.get_cached_playlist(token, link)
+        whole = tracks is not None
+        if not whole:
+            tracks, whole = spotify_client.get_random_playlist_page(token, link)
+        now = time.time()
+        known = _load(playlist_id)["tracks"]
+        unknown = [s for s in tracks if track_key(s) not in known or not _is_known(known[track_key(s)], now)]
+        batch = random.sample(unknown, min(limit, len(unknown)))
+        with ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="lyringo-index") as pool:
+            results = list(pool.map(_lookup, batch))
+        rows = [
+            (song, genius_client.has_lyrics(lyrics), lyrics.language if lyrics else None)
+            for song, (ok, lyrics) in zip(batch, results) if ok
+        ]
+        # Removed tracks can only be dropped, and the playlist count as probed
+        # once nothing unknown is left, when all of its tracks were seen.
+        if whole:
+            record_many(playlist_id, rows, keep={track_key(s) for s in tracks}, probed=len(unknown) <= limit)
+        else:
+            record_many(playlist_id, rows)
+    except Exception:
+        # Best effort: the game falls back to unindexed sampling.
+        pass
+    finally:
+        with _lock:
+            _probing.discard(playlist_id)
+
+
+def probe_in_background(token, link: str, limit: int = BACKGROUND_PROBES) -> Optional[threading.Thread]:
+    """
+    Look up to `limit` of the playlist's unknown tracks on Genius in a
+    daemon thread and record the results. Does nothing if a run for this
+    playlist is in flight or all its tracks were checked recently.
+    """
+    playlist_id = spotify_client.extract_playlist_id(link)
+    if time.time() - _load(playlist_id)["probed_at"] < REPROBE_AFTER:
+        return None
+    with _lock:
+        if playlist_id in _probing:
+            return None
+        _probing.add(playlist_id)
+    thread = threading.Thread(target=_probe_unknown, args=(token, link, playlist_id, limit),
+                              name="lyringo-index", daemon=True)
+    thread.start()
+    return thread
+
+
+def _from_index(good: List[dict], n: int) -> Tuple[List[dict], int]:
+    """
+    The known-good tracks to use for a pick of `n`, and how many more to
+    sample from the playlist.
+    """
+    share = min(n, len(good) // GOOD_POOL_FACTOR)
+    return random.sample(good, share), n - share
+
+
+def _merge(picked: List[dict], sampled: List[dict]) -> List[dict]:
+    seen = {track_key(s) for s in picked}
+    return picked + [s for s in sampled if track_key(s) not in seen]
+
+
+@trace.traced("lyrics_index.pick_songs")
+def pick_songs(token, link: str, n: int) -> List[dict]:
+    """
+    Choose up to `n` random tracks to try. Known-good tracks make up a
+    share of the pick that grows with the index; the rest is sampled from
+    the playlist like `get_random_songs_from_playlist`. Either way unknown
+    tracks are probed in the background so later picks have more to choose
+    from.
+    """
+    good = known_good(spotify_client.extract_playlist_id(link))
+    probe_in_background(token, link)
+    picked, wanted = _from_index(good, n)
+    if wanted:
+        picked = _merge(picked, spotify_client.get_random_songs_from_playlist(token, link, wanted))
+    return picked
+
+
+@trace.traced("lyrics_index.pick_songs")
+async def apick_songs(token, link: str, n: int) -> List[dict]:
+    """
+    Async variant of `pick_songs`; the playlist is sampled on the event loop.
+    """
+    good = known_good(spotify_client.extract_playlist_id(link))
+    probe_in_background(token, link)
+    picked, wanted = _from_index(good, n)
+    if wanted:
+        picked = _merge(picked, await spotify_client.aget_random_songs_from_playlist(token, link, wanted))
+    return picked
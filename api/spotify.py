@@ -1,14 +1,12 @@
-from dotenv import load_dotenv
-import os 
 import base64
-import requests
 import json
 import random 
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 
-load_dotenv()
-
-spotify_client_id = os.getenv("SPOTIFY_CLIENT_ID")
-spotify_client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+from api import async_transport, config, trace, transport
+from api.cache import PersistentCache
 
 REDIRECT_URI = "http://localhost:5000/callback"
 SPOTIFY_AUTH_URL = "https://accounts.spotify.com/authorize"
@@ -16,9 +14,29 @@ SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
 SPOTIFY_API_BASE_URL = "https://api.spotify.com"
 SPOTIFY_SEARCH_URL = "https://api.spotify.com/v1/search"
 
-# Get access token
-def get_token():
-    auth_string = spotify_client_id + ":" + spotify_client_secret 
+# Spotify returns at most 100 playlist tracks per request.
+PLAYLIST_PAGE_SIZE = 100
+PLAYLIST_PAGE_FIELDS = "items(track(name, artists(name))),total,next"
+# Upper bound on playlist pages requested at the same time.
+PLAYLIST_FETCH_WORKERS = 8
+# When sampling random tracks, give up after drawing this many offsets that
+# turned out to be unavailable (removed/local tracks come back as null).
+SAMPLE_MAX_DRAWS = 10
+SAMPLE_TRACK_FIELDS = "items(track(name, artists(name)))"
+
+# Downloaded playlists keyed by playlist ID, stored with the snapshot_id they
+# were downloaded at. A cached copy is reused as long as Spotify still reports
+# the same snapshot_id; the check is repeated at most every REVALIDATE_AFTER
+# seconds within one process.
+PLAYLIST_TTL = 7 * 24 * 3600
+REVALIDATE_AFTER = 60
+playlist_cache = PersistentCache("playlists", ttl=PLAYLIST_TTL, max_entries=200, memory_entries=16)
+_validated_at = {}
+_validated_lock = threading.Lock()
+
+# Request a new access token. Returns (token, expires_in seconds).
+def _request_token():
+    auth_string = config.get("SPOTIFY_CLIENT_ID") + ":" + config.get("SPOTIFY_CLIENT_SECRET")
     # Base64 requires bytes
     auth_bytes = auth_string.encode("utf-8")
     # HTTP headers can only contain text, so we turn back to string
@@ -30,13 +48,110 @@ def get_token():
         "Content-Type": "application/x-www-form-urlencoded"
     }
     data = {"grant_type": "client_credentials"}
-    result = requests.post(SPOTIFY_TOKEN_URL, headers=headers, data=data)
+    result = transport.post(SPOTIFY_TOKEN_URL, headers=headers, data=data)
 
     # Parse result to get token
     json_result = json.loads(result.content)
     token = json_result["access_token"]
-    return token 
+    return token, json_result.get("expires_in", 3600)
+
+
+class TokenManager:
+    """
+    Hands out a client-credentials access token, reusing it until shortly
+    before it expires.
+
+    The token is kept in memory and in the on-disk cache, so a new game
+    starts without the auth round trip. A timer refreshes it in the background
+    REFRESH_AHEAD seconds before it goes stale, and concurrent callers that
+    find no valid token wait for one shared in-flight request instead of each
+    sending their own POST.
+    """
+
+    # Treat a token as expired this many seconds early.
+    EXPIRY_MARGIN = 60
+    # Start a background refresh this long before the margin is reached.
+    REFRESH_AHEAD = 120
+
+    def __init__(self):
+        self._cache = PersistentCache("spotify_token", max_entries=8, memory_entries=8)
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+        self._inflight = None
+        self._timer = None
+
+    def _cache_key(self):
+        # Different credentials must not share a token.
+        return config.get("SPOTIFY_CLIENT_ID") or ""
+
+    def get_token(self):
+        with self._lock:
+            if self._token and time.time() < self._expires_at - self.EXPIRY_MARGIN:
+                return self._token
+            if not self._token:
+                cached = self._cache.get(self._cache_key())
+                if cached and time.time() < cached["expires_at"] - self.EXPIRY_MARGIN:
+                    self._token, self._expires_at = cached["access_token"], cached["expires_at"]
+                    self._schedule_refresh()
+                    return self._token
+            inflight = self._inflight
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight = Future()
 
+        if leader:
+            self._refresh(inflight)
+        return inflight.result()
+
+    def _refresh(self, future):
+        try:
+            token, expires_in = _request_token()
+        except Exception as e:
+            with self._lock:
+                self._inflight = None
+            future.set_exception(e)
+            return
+
+        expires_at = time.time() + expires_in
+        with self._lock:
+            self._token, self._expires_at = token, expires_at
+            self._inflight = None
+            self._schedule_refresh()
+        self._cache.set(
+            self._cache_key(),
+            {"access_token": token, "expires_at": expires_at},
+            ttl=max(0, expires_in - self.EXPIRY_MARGIN),
+        )
+        future.set_result(token)
+
+    def _schedule_refresh(self):
+        # Called with the lock held.
+        if self._timer:
+            self._timer.cancel()
+        delay = self._expires_at - self.EXPIRY_MARGIN - self.REFRESH_AHEAD - time.time()
+        self._timer = threading.Timer(max(0, delay), self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            if self._inflight is not None:
+                return
+            future = self._inflight = Future()
+        # On failure the error just stays on the future; the current token is
+        # still usable and the next get_token() after it expires tries again.
+        self._refresh(future)
+
+
+token_manager = TokenManager()
+
+# Get access token
+@trace.traced("spotify.get_token")
+def get_token():
+    return token_manager.get_token()
+
+@trace.traced("spotify.search_for_artist")
 def search_for_artist(token, artist_name: str):
     params = {
         "q": artist_name, 
@@ -46,7 +161,7 @@ def search_for_artist(token, artist_name: str):
     headers = {
         "Authorization": f"Bearer {token}"
     }
-    response = requests.get(SPOTIFY_SEARCH_URL, params = params, headers = headers) 
+    response = transport.get(SPOTIFY_SEARCH_URL, params = params, headers = headers) 
     if response.status_code != 200:
         print(f"Request failed with status code: {response.status_code}")
         return None
@@ -83,58 +198,346 @@ def extract_playlist_id(playlist_link):
         # Assume the user already pasted the ID directly
         return playlist_link.strip()
     
-def get_playlist_by_link(token, playlist_link):
-    link = extract_playlist_id(playlist_link)
-    url = f"https://api.spotify.com/v1/playlists/{link}/tracks"
-    
+def _parse_playlist_items(data):
+    tracks = []
+    for item in data.get("items", []):
+        track = item.get("track")
+        if not track:
+            # Skip unavailable tracks
+            continue
+
+        track_name = track.get("name")
+        artist_names = [artist.get("name") for artist in track.get("artists", []) if artist.get("name")]
+        tracks.append({
+            "track_name": track_name, "artist_names": artist_names
+        })
+    return tracks
+
+def _tracks_page_request(token, playlist_id, offset, limit, fields):
+    url = f"{SPOTIFY_API_BASE_URL}/v1/playlists/{playlist_id}/tracks"
     headers = {
         "Authorization": f"Bearer {token}"
     }
-    
     params = {
-        # Tracks name, artists name and next page
-        "fields": "items(track(name, artists(name))),next",
-        "limit": 100
-    } 
+        "fields": fields,
+        "limit": limit,
+        "offset": offset,
+    }
+    return url, headers, params
 
-    result = requests.get(url, headers=headers, params=params)
-    data = result.json()
+def _snapshot_request(token, playlist_id):
+    # Only ask for the snapshot_id field so the response is a few bytes.
+    url = f"{SPOTIFY_API_BASE_URL}/v1/playlists/{playlist_id}"
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    return url, headers, {"fields": "snapshot_id"}
 
-    all_tracks_in_playlist = []
+# Fetch one page of a playlist's tracks
+@trace.traced("spotify.playlist_page")
+def _get_tracks_page(token, playlist_id, offset=0, limit=PLAYLIST_PAGE_SIZE, fields=PLAYLIST_PAGE_FIELDS):
+    url, headers, params = _tracks_page_request(token, playlist_id, offset, limit, fields)
+    return transport.get(url, headers=headers, params=params).json()
 
-    while True:
-        for item in data.get("items", []):
-            track = item.get("track")
-            if not track: 
-                # Skip unavailable tracks
-                continue
+@trace.traced("spotify.playlist_page")
+async def _aget_tracks_page(token, playlist_id, offset=0, limit=PLAYLIST_PAGE_SIZE, fields=PLAYLIST_PAGE_FIELDS):
+    url, headers, params = _tracks_page_request(token, playlist_id, offset, limit, fields)
+    return (await async_transport.get(url, headers=headers, params=params)).json()
+
+@trace.traced("spotify.snapshot_id")
+def get_playlist_snapshot_id(token, playlist_id):
+    url, headers, params = _snapshot_request(token, playlist_id)
+    return transport.get(url, headers=headers, params=params).json().get("snapshot_id")
+
+@trace.traced("spotify.snapshot_id")
+async def aget_playlist_snapshot_id(token, playlist_id):
+    url, headers, params = _snapshot_request(token, playlist_id)
+    return (await async_transport.get(url, headers=headers, params=params)).json().get("snapshot_id")
 
-            track_name = track.get("name")
-            artist_names = [artist.get("name") for artist in track.get("artists", []) if artist.get("name")]
-            all_tracks_in_playlist.append({
-                "track_name": track_name, "artist_names": artist_names
-            })
+def _recently_validated(playlist_id):
+    """Return the cached playlist if its snapshot was checked very recently."""
+    cached = playlist_cache.get(playlist_id)
+    if cached:
+        with _validated_lock:
+            if time.monotonic() - _validated_at.get(playlist_id, float("-inf")) < REVALIDATE_AFTER:
+                return cached
+    return None
 
-        next_url = data.get("next")
-        if not next_url:
-            break 
+def _validate(playlist_id, snapshot_id):
+    """Return the cached tracks if they match the current `snapshot_id`."""
+    cached = playlist_cache.get(playlist_id)
+    if cached and snapshot_id and cached.get("snapshot_id") == snapshot_id:
+        with _validated_lock:
+            _validated_at[playlist_id] = time.monotonic()
+        return cached["tracks"]
+    return None
 
-        resp = requests.get(next_url, headers=headers)
-        data = resp.json()
+def _store_playlist(playlist_id, snapshot_id, tracks):
+    # The snapshot was read before downloading, so if the playlist changed in
+    # between, the next call simply sees a new snapshot_id and refetches.
+    if snapshot_id:
+        playlist_cache.set(playlist_id, {"snapshot_id": snapshot_id, "tracks": tracks})
+        with _validated_lock:
+            _validated_at[playlist_id] = time.monotonic()
 
+def _cached_playlist(token, playlist_id):
+    """
+    Return (tracks, snapshot_id). `tracks` is the cached track list if it is
+    still current, otherwise None. `snapshot_id` is the playlist's current
+    snapshot when it had to be looked up.
+    """
+    cached = _recently_validated(playlist_id)
+    if cached:
+        return cached["tracks"], cached["snapshot_id"]
+    snapshot_id = get_playlist_snapshot_id(token, playlist_id)
+    return _validate(playlist_id, snapshot_id), snapshot_id
+
+async def _acached_playlist(token, playlist_id):
+    cached = _recently_validated(playlist_id)
+    if cached:
+        return cached["tracks"], cached["snapshot_id"]
+    snapshot_id = await aget_playlist_snapshot_id(token, playlist_id)
+    return _validate(playlist_id, snapshot_id), snapshot_id
+
+def _remaining_offsets(data):
+    """
+    Offsets of the pages after the first one, `data`, or None if Spotify
+    didn't report the playlist size and the `next` links must be followed.
+    """
+    total = data.get("total")
+    if not isinstance(total, int):
+        return None
+    return range(PLAYLIST_PAGE_SIZE, total, PLAYLIST_PAGE_SIZE)
+
+@trace.traced("spotify.get_playlist")
+def get_playlist_by_link(token, playlist_link, max_workers=PLAYLIST_FETCH_WORKERS, use_cache=True):
+    link = extract_playlist_id(playlist_link)
+
+    snapshot_id = None
+    if use_cache:
+        cached_tracks, snapshot_id = _cached_playlist(token, link)
+        if cached_tracks is not None:
+            return list(cached_tracks)
+
+    all_tracks_in_playlist = _download_playlist(token, link, max_workers)
+    _store_playlist(link, snapshot_id, all_tracks_in_playlist)
     return all_tracks_in_playlist
 
-# Choose a random song from a playlist
-def get_random_song_from_playlist(token, playlist_link):
-    # Get all songs from a playlist
-    all_tracks = get_playlist_by_link(token, playlist_link)
+def _download_playlist(token, link, max_workers):
+    def get_page(offset):
+        # Tracks name, artists name and the playlist size
+        return _get_tracks_page(token, link, offset)
+
+    data = get_page(0)
+    all_tracks_in_playlist = _parse_playlist_items(data)
+
+    offsets = _remaining_offsets(data)
+    if offsets is None:
+        # No size reported: fall back to following the `next` links one by one.
+        headers = {"Authorization": f"Bearer {token}"}
+        while data.get("next"):
+            data = transport.get(data["next"], headers=headers).json()
+            all_tracks_in_playlist.extend(_parse_playlist_items(data))
+        return all_tracks_in_playlist
+
+    # The first page told us the size, so every remaining page can be
+    # requested at once. `map` keeps the pages in playlist order.
+    if offsets:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(offsets)))) as executor:
+            for page in executor.map(trace.propagate(get_page), offsets):
+                all_tracks_in_playlist.extend(_parse_playlist_items(page))
+
+    return all_tracks_in_playlist
+
+@trace.traced("spotify.get_playlist")
+async def aget_playlist_tracks(token, playlist_link, max_workers=PLAYLIST_FETCH_WORKERS, use_cache=True):
+    """
+    Async variant of `get_playlist_by_link`: same cache, same result, with
+    the remaining pages requested concurrently (at most `max_workers` at a
+    time) on the event loop instead of in threads.
+    """
+    link = extract_playlist_id(playlist_link)
+
+    snapshot_id = None
+    if use_cache:
+        cached_tracks, snapshot_id = await _acached_playlist(token, link)
+        if cached_tracks is not None:
+            return list(cached_tracks)
+
+    all_tracks_in_playlist = await _adownload_playlist(token, link, max_workers)
+    _store_playlist(link, snapshot_id, all_tracks_in_playlist)
+    return all_tracks_in_playlist
+
+async def _adownload_playlist(token, link, max_workers):
+    # asyncio is only imported by the async variants; see api/async_transport.py.
+    import asyncio
+
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def get_page(offset):
+        async with semaphore:
+            return await _aget_tracks_page(token, link, offset)
+
+    data = await get_page(0)
+    all_tracks_in_playlist = _parse_playlist_items(data)
+
+    offsets = _remaining_offsets(data)
+    if offsets is None:
+        headers = {"Authorization": f"Bearer {token}"}
+        while data.get("next"):
+            data = (await async_transport.get(data["next"], headers=headers)).json()
+            all_tracks_in_playlist.extend(_parse_playlist_items(data))
+        return all_tracks_in_playlist
+
+    # gather keeps the pages in playlist order
+    for page in await asyncio.gather(*(get_page(offset) for offset in offsets)):
+        all_tracks_in_playlist.extend(_parse_playlist_items(page))
+    return all_tracks_in_playlist
+
+class _TrackSampler:
+    """
+    The offsets drawn so far and the tracks found at them, for up to `n`
+    distinct random tracks out of `total`. Shared by the sync and async
+    samplers, which only differ in how the pages are fetched.
+    """
+
+    def __init__(self, n, total):
+        self.n = n
+        self.total = total
+        self.tried = set()
+        self.chosen = []
+        self.draws_left = max(n, SAMPLE_MAX_DRAWS)
+
+    def next_offsets(self):
+        """Fresh offsets to fetch next; empty once sampling is over."""
+        wanted = min(self.n - len(self.chosen), self.draws_left, self.total - len(self.tried))
+        offsets = []
+        while len(offsets) < wanted:
+            offset = random.randrange(self.total)
+            if offset not in self.tried:
+                self.tried.add(offset)
+                offsets.append(offset)
+        self.draws_left -= len(offsets)
+        return offsets
+
+    def add(self, pages):
+        # Unavailable tracks come back as empty pages and are skipped.
+        for page in pages:
+            tracks = _parse_playlist_items(page)
+            if tracks:
+                self.chosen.append(tracks[0])
+
+def _sample_playlist_tracks(token, playlist_link, n):
+    """
+    Pick up to `n` distinct random tracks without downloading the playlist.
+
+    If the playlist is cached and unchanged, the tracks are drawn from the
+    cached copy. Otherwise one tiny request learns the playlist size, then
+    only the single-track pages at the drawn offsets are fetched
+    (concurrently). Unavailable tracks are skipped by drawing new offsets, up
+    to SAMPLE_MAX_DRAWS in total.
+    """
+    playlist_id = extract_playlist_id(playlist_link)
+
+    # A current cached copy of the whole playlist is even cheaper. Don't pay
+    # for a snapshot lookup when nothing is cached.
+    if playlist_cache.get(playlist_id):
+        cached_tracks, _ = _cached_playlist(token, playlist_id)
+        if cached_tracks:
+            return random.sample(cached_tracks, min(n, len(cached_tracks)))
+
+    total = _get_tracks_page(token, playlist_id, limit=1, fields="total").get("total") or 0
+    if total <= 0:
+        return []
+
+    def get_track(offset):
+        return _get_tracks_page(token, playlist_id, offset, limit=1, fields=SAMPLE_TRACK_FIELDS)
+
+    sampler = _TrackSampler(n, total)
+    with ThreadPoolExecutor(max_workers=max(1, min(n, PLAYLIST_FETCH_WORKERS))) as executor:
+        while True:
+            offsets = sampler.next_offsets()
+            if not offsets:
+                break
+            sampler.add(executor.map(trace.propagate(get_track), offsets))
+    return sampler.chosen
+
+async def _asample_playlist_tracks(token, playlist_link, n):
+    """
+    Async variant of `_sample_playlist_tracks`, fetching the drawn tracks
+    concurrently on the event loop.
+    """
+    import asyncio
+
+    playlist_id = extract_playlist_id(playlist_link)
+
+    if playlist_cache.get(playlist_id):
+        cached_tracks, _ = await _acached_playlist(token, playlist_id)
+        if cached_tracks:
+            return random.sample(cached_tracks, min(n, len(cached_tracks)))
+
+    total = (await _aget_tracks_page(token, playlist_id, limit=1, fields="total")).get("total") or 0
+    if total <= 0:
+        return []
+
+    semaphore = asyncio.Semaphore(max(1, min(n, PLAYLIST_FETCH_WORKERS)))
+
+    async def get_track(offset):
+        async with semaphore:
+            return await _aget_tracks_page(token, playlist_id, offset, limit=1, fields=SAMPLE_TRACK_FIELDS)
+
+    sampler = _TrackSampler(n, total)
+    while True:
+        offsets = sampler.next_offsets()
+        if not offsets:
+            break
+        sampler.add(await asyncio.gather(*(get_track(offset) for offset in offsets)))
+    return sampler.chosen
+
+def get_cached_playlist(token, playlist_link):
+    """
+    The playlist's tracks if a current copy is cached, else None. Never
+    downloads the playlist; at most its snapshot_id is checked.
+    """
+    playlist_id = extract_playlist_id(playlist_link)
+    if not playlist_cache.get(playlist_id):
+        return None
+    cached_tracks, _ = _cached_playlist(token, playlist_id)
+    return list(cached_tracks) if cached_tracks is not None else None
+
+@trace.traced("spotify.random_page")
+def get_random_playlist_page(token, playlist_link):
+    """
+    Return (tracks, whole): the tracks of one random page of the playlist
+    (up to PLAYLIST_PAGE_SIZE in a row) and whether that is all of it. Costs
+    one or two requests however large the playlist is.
+    """
+    playlist_id = extract_playlist_id(playlist_link)
+    data = _get_tracks_page(token, playlist_id)
+    total = data.get("total")
+    if not isinstance(total, int) or total <= PLAYLIST_PAGE_SIZE:
+        return _parse_playlist_items(data), not data.get("next")
+    offset = random.randrange(0, total, PLAYLIST_PAGE_SIZE)
+    if offset:
+        data = _get_tracks_page(token, playlist_id, offset)
+    return _parse_playlist_items(data), False
+
+# Choose a random song from a playlist. With `sample=True` only the chosen
+# track is downloaded (2 small requests); otherwise the whole playlist is.
+@trace.traced("spotify.random_song")
+def get_random_song_from_playlist(token, playlist_link, sample=True):
+    if sample:
+        picked = _sample_playlist_tracks(token, playlist_link, 1)
+        random_song = picked[0] if picked else None
+    else:
+        # Get all songs from a playlist
+        all_tracks = get_playlist_by_link(token, playlist_link)
+        random_song = random.choice(all_tracks) if all_tracks else None
 
     # No songs in playlist
-    if not all_tracks:
+    if not random_song:
         print("No tracks in this playlist")
         return None 
-    
-    random_song = random.choice(all_tracks)
 
     # Announce which song was chosen
     track_name = random_song.get("track_name") or "Unknown track"
@@ -145,6 +548,28 @@ def get_random_song_from_playlist(token, playlist_link):
     print("")
     return random_song
 
+# Choose several distinct random songs from a playlist, e.g. to probe them
+# for lyrics in parallel. Returns fewer than `n` if the playlist is small.
+@trace.traced("spotify.random_songs")
+def get_random_songs_from_playlist(token, playlist_link, n, sample=True):
+    if sample:
+        return _sample_playlist_tracks(token, playlist_link, n)
+    all_tracks = get_playlist_by_link(token, playlist_link)
+    if not all_tracks:
+        return []
+    return random.sample(all_tracks, min(n, len(all_tracks)))
+
+@trace.traced("spotify.random_songs")
+async def aget_random_songs_from_playlist(token, playlist_link, n, sample=True):
+    """
+    Async variant of `get_random_songs_from_playlist`.
+    """
+    if sample:
+        return await _asample_playlist_tracks(token, playlist_link, n)
+    all_tracks = await aget_playlist_tracks(token, playlist_link)
+    if not all_tracks:
+        return []
+    return random.sample(all_tracks, min(n, len(all_tracks)))
+
 # TODO Write a function that pads Chosen song to the right width
 # TODO Add a flag when the entire song is over asking to play the game again
-# TODO Instead of sending request to tgranslate after user inputs, send request before and then print
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""
+Timing spans for the api calls and game stages.
+
+Set LYRINGO_TRACE to a file path to append one JSON line per finished span:
+its name, duration, parent span and whatever the code attached (bytes,
+retries, cache hits...). HTTP responses are recorded as "http <host>" spans
+by the transports. The setting is read when the first span or traced call
+happens, not at import. Without LYRINGO_TRACE, traced functions only check
+a flag and `span()` hands back a shared do-nothing object, so the
+instrumentation costs next to nothing.
+
+Print a per-stage breakdown of a trace with:
+
+    python -m api.trace lyringo-trace.jsonl
+"""
+import argparse
+import atexit
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from api import config
+
+_path = None
+_enabled = None
+
+# Counters summed per span name by the summarizer.
+COUNTERS = ("bytes", "retries", "cache_hits", "cache_misses")
+
+_ids = itertools.count(1)
+_current = contextvars.ContextVar("lyringo_span", default=None)
+_file = None
+_write_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    """Whether LYRINGO_TRACE is set; looked up once, on first use."""
+    global _path, _enabled
+    if _enabled is None:
+        _path = config.get("LYRINGO_TRACE") or None
+        _enabled = _path is not None
+    return _enabled
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, key, n=1):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed stage; use as a context manager. Nested spans record their parent."""
+
+    __slots__ = ("name", "id", "parent", "attrs", "_wall", "_start", "_token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.id = next(_ids)
+        self.parent = None
+        self.attrs = attrs
+
+    def __enter__(self):
+        parent = _current.get()
+        self.parent = parent.id if parent else None
+        self._token = _current.set(self)
+        self._wall = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _write(self.name, self.id, self.parent, self._wall, seconds, self.attrs)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes to the span's trace event."""
+        self.attrs.update(attrs)
+
+    def add(self, key: str, n: int = 1):
+        """Add to a counter such as "bytes" or "cache_hits"."""
+        self.attrs[key] = self.attrs.get(key, 0) + n
+
+
+def _write(name, span_id, parent, wall, seconds, attrs):
+    global _file
+    event = {
+        "name": name,
+        "id": span_id,
+        "parent": parent,
+        "start": round(wall, 6),
+        "ms": round(seconds * 1000, 3),
+        "thread": threading.current_thread().name,
+        **attrs,
+    }
+    line = json.dumps(event, default=str) + "\n"
+    with _write_lock:
+        if _file is None:
+            _file = open(_path, "a", encoding="utf-8")
+            atexit.register(_file.close)
+        _file.write(line)
+        _file.flush()
+
+
+def span(name: str, **attrs):
+    """A context manager timing the code inside it (a no-op unless tracing)."""
+    if not enabled():
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+def current():
+    """The innermost active span, or a do-nothing stand-in."""
+    return (_current.get() or _NULL_SPAN) if enabled() else _NULL_SPAN
+
+
+def count(key: str, n: int = 1) -> None:
+    """Add `n` to a counter on the innermost active span, if any."""
+    if enabled():
+        active = _current.get()
+        if active is not None:
+            active.add(key, n)
+
+
+def event(name: str, seconds: float, **attrs) -> None:
+    """Record something that was already timed elsewhere, e.g. an HTTP response."""
+    if enabled():
+        parent = _current.get()
+        _write(name, next(_ids), parent.id if parent else None, time.time() - seconds, seconds, attrs)
+
+
+def traced(name: Optional[str] = None):
+    """
+    Decorator wrapping every call in a span named `name` (by default
+    module.function). Without tracing the function is called as is.
+    """
+    def decorate(fn):
+        label = name or f"{fn.__module__.rpartition('.')[2]}.{fn.__name__}"
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not enabled():
+                    return await fn(*args, **kwargs)
+                with Span(label, {}):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return fn(*args, **kwargs)
+            with Span(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def propagate(fn):
+    """
+    Make spans opened by `fn` in a worker thread children of the span that
+    is active now, where the work was handed out.
+    """
+    if not enabled():
+        return fn
+    parent = _current.get()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+def load(path: str) -> List[dict]:
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                events.append(json.loads(line))
+    return events
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(events: List[dict]) -> List[dict]:
+    """
+    One row per span name: count, total/self/mean/p50/p95/max milliseconds
+    and the summed COUNTERS, slowest total first. Self time is the span's
+    time minus that of its children; children running in parallel can add up
+    to more than their parent, so it never goes below zero.
+    """
+    child_ms: Dict[int, float] = defaultdict(float)
+    for e in events:
+        if e.get("parent") is not None:
+            child_ms[e["parent"]] += e["ms"]
+
+    groups = defaultdict(list)
+    for e in events:
+        groups[e["name"]].append(e)
+
+    rows = []
+    for name, group in groups.items():
+        durations = sorted(e["ms"] for e in group)
+        row = {
+            "name": name,
+            "count": len(group),
+            "total_ms": sum(durations),
+            "self_ms": sum(max(0.0, e["ms"] - child_ms.get(e["id"], 0.0)) for e in group),
+            "mean_ms": sum(durations) / len(durations),
+            "p50_ms": _percentile(durations, 0.5),
+            "p95_ms": _percentile(durations, 0.95),
+            "max_ms": durations[-1],
+        }
+        for counter in COUNTERS:
+            row[counter] = sum(e.get(counter, 0) for e in group)
+        rows.append(row)
+    rows.sort(key=lambda r: -r["total_ms"])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a per-stage latency breakdown of a LYRINGO_TRACE file.")
+    parser.add_argument("path")
+    parser.add_argument("--top", type=int, default=40, help="show at most this many stages")
+    args = parser.parse_args()
+
+    events = load(args.path)
+    rows = summarize(events)
+    roots = sum(e["ms"] for e in events if e.get("parent") is None)
+    print(f"{len(events)} spans, {roots / 1000:.2f} s in top-level spans")
+    print(f"  {'stage':<34} {'count':>6} {'total ms':>10} {'self ms':>10} {'share':>6} "
+          f"{'p50':>8} {'p95':>8} {'max':>8} {'bytes':>9} {'retries':>7} {'cache h/m':>10}")
+    for r in rows[:args.top]:
+        share = 100 * r["total_ms"] / roots if roots else 0.0
+        print(f"  {r['name'][:34]:<34} {r['count']:6d} {r['total_ms']:10.1f} {r['self_ms']:10.1f} {share:5.1f}% "
+              f"{r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['max_ms']:8.1f} {r['bytes']:9d} {r['retries']:7d} "
+              f"{r['cache_hits']:>4d}/{r['cache_misses']:<5d}")
+
+
+if __name__ == "__main__":
+    main()
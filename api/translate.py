@@ -1,9 +1,26 @@
 import re
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from typing import Tuple, Optional, List
-import requests
+from urllib.parse import quote
+
+from api import async_transport, langid, trace, transport
+from api.cache import PersistentCache
+from api import lyrics as lyrics_text
+from api.lyrics import Lyrics
 
 GOOGLE_TRANSLATE_URL = "https://translate.googleapis.com/translate_a/single"
 
+# Google rejects very long GET URLs. Keep the URL-encoded `q` of each batch
+# comfortably below the common ~2k character limit.
+MAX_QUERY_CHARS = 1800
+
+# Translations of lyric lines/paragraphs, keyed by normalized text + target
+# language, so repeated choruses and replayed songs cost no requests.
+TRANSLATION_TTL = 30 * 24 * 3600
+cache = PersistentCache("translations", ttl=TRANSLATION_TTL, max_entries=50000, memory_entries=4096)
+
 _LANG_NAME_TO_CODE = {
     "afrikaans": "af",
     "albanian": "sq",
@@ -126,6 +143,108 @@ _LANG_NAME_TO_CODE = {
 # also create reverse mapping for quick lookup by code
 _SUPPORTED_CODES = set(_LANG_NAME_TO_CODE.values())
 
+# Everything below is built once at import so a lookup costs a few dict
+# probes instead of a scan over the table.
+
+_NON_NAME_CHARS = re.compile(r"[^\w\s-]")
+_SPACES = re.compile(r"\s+")
+
+
+def _normalize_language_name(name: str) -> str:
+    # "Chinese (Simplified)" -> "chinese simplified", "Svenska " -> "svenska"
+    s = _NON_NAME_CHARS.sub(" ", name.casefold().replace("_", " "))
+    return _SPACES.sub(" ", s).strip()
+
+
+# casefolded code -> canonical code ("zh-cn" -> "zh-CN")
+_CODE_INDEX = {code.casefold(): code for code in _SUPPORTED_CODES}
+# normalized name -> code
+_NAME_INDEX = {}
+# code -> display name: the first ASCII (English) name in the table, else
+# the first name
+_DISPLAY_NAME = {}
+for _name, _code in _LANG_NAME_TO_CODE.items():
+    _NAME_INDEX.setdefault(_normalize_language_name(_name), _code)
+    if _name.isascii() and len(_name) > 2 and _code not in _DISPLAY_NAME:
+        _DISPLAY_NAME[_code] = _name
+for _name, _code in _LANG_NAME_TO_CODE.items():
+    _DISPLAY_NAME.setdefault(_code, _name)
+
+# Candidate names in ranking order: shorter names first, then table order,
+# so a partial or fuzzy match always resolves the same way.
+_RANKED_NAMES = sorted(_NAME_INDEX, key=len)
+_NAME_RANK = {name: rank for rank, name in enumerate(_RANKED_NAMES)}
+
+# Prefix index: every prefix of every word of every name -> the best-ranked
+# name starting there ("swe" -> swedish, "simpl" -> chinese simplified).
+_PREFIX_INDEX = {}
+for _name in _RANKED_NAMES:
+    for _start in [0] + [i + 1 for i, ch in enumerate(_name) if ch == " "]:
+        for _end in range(_start + 1, len(_name) + 1):
+            _PREFIX_INDEX.setdefault(_name[_start:_end], _name)
+
+# Trigram index for typos: trigram -> names containing it.
+def _trigrams(s: str):
+    padded = f"  {s} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+_TRIGRAM_INDEX = {}
+for _name in _RANKED_NAMES:
+    for _gram in _trigrams(_name):
+        _TRIGRAM_INDEX.setdefault(_gram, []).append(_name)
+del _name, _code, _start, _end, _gram
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Levenshtein distance, or limit + 1 once it is known to exceed limit.
+    Only the band of cells within `limit` of the diagonal is computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        row_min = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != b[j - 1]))
+            current[j] = cost if cost < over else over
+            if cost < row_min:
+                row_min = cost
+        if row_min > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+
+@lru_cache(maxsize=1024)
+def _fuzzy_language_name(s: str) -> Optional[str]:
+    # Allow one typo in short names, two from six characters on.
+    limit = 1 if len(s) < 6 else 2
+    grams = _trigrams(s)
+    shared = {}
+    for gram in grams:
+        for name in _TRIGRAM_INDEX.get(gram, ()):
+            shared[name] = shared.get(name, 0) + 1
+    # Each edit changes at most three trigrams, so a name sharing `count` of
+    # the query's trigrams is at least ceil((len(grams) - count) / 3) edits
+    # away. Trying names with the most shared trigrams first lets that bound
+    # skip nearly all of the others once a close match is found.
+    best = None
+    for name, count in sorted(shared.items(), key=lambda item: (-item[1], _NAME_RANK[item[0]])):
+        lower_bound = -(-(len(grams) - count) // 3)
+        if lower_bound > limit or (best is not None and lower_bound > best[0][0]):
+            continue
+        distance = _edit_distance(s, name, limit)
+        if distance <= limit:
+            key = (distance, -count, _NAME_RANK[name])
+            if best is None or key < best[0]:
+                best = (key, name)
+    return best[1] if best else None
+
 
 def language_name_to_code(name: str) -> Optional[str]:
     """
@@ -135,32 +254,30 @@ def language_name_to_code(name: str) -> Optional[str]:
       language_name_to_code("english") -> "en"
       language_name_to_code("en") -> "en"
       language_name_to_code("svenska") -> "sv"
+      language_name_to_code("swe") -> "sv"       (prefix)
+      language_name_to_code("swedsh") -> "sv"    (typo)
     Returns None if the language can't be resolved.
     """
     if not name:
         return None
-    s = name.strip().lower()
-    # direct code passed in, accept if in supported codes or looks like two-letter code
-    if s in _SUPPORTED_CODES:
-        return s
-    # canonicalize common two-letter inputs (without region)
+    code = _CODE_INDEX.get(name.strip().casefold())
+    if code:
+        return code
+    s = _normalize_language_name(name)
+    if not s:
+        return None
+    if s in _NAME_INDEX:
+        return _NAME_INDEX[s]
+    # allow passing codes like 'en', 'sv' even if they weren't in mapping values
     if len(s) == 2 and s.isalpha():
-        # allow passing codes like 'en', 'sv' even if they weren't in mapping values
         return s
-    # remove punctuation and common words
-    s = re.sub(r'[^a-z\- ]', '', s)
-    s = s.replace("_", " ").strip()
-    # exact name match
-    if s in _LANG_NAME_TO_CODE:
-        return _LANG_NAME_TO_CODE[s]
-    # try each mapping key for partial match (e.g. "chinese simplified" -> zh-CN)
-    for key, code in _LANG_NAME_TO_CODE.items():
-        if s == key:
-            return code
-    for key, code in _LANG_NAME_TO_CODE.items():
-        if s in key:
-            return code
-    # if nothing matched, return None
+    # partial name, e.g. "swe" or "simplified"
+    if len(s) >= 3 and s in _PREFIX_INDEX:
+        return _NAME_INDEX[_PREFIX_INDEX[s]]
+    if len(s) >= 4:
+        match = _fuzzy_language_name(s)
+        if match:
+            return _NAME_INDEX[match]
     return None
 
 
@@ -169,121 +286,264 @@ def code_to_display_name(code_or_name: str) -> str:
     Convert a language code or name to a human-friendly display name.
 
     Accepts either a code (e.g. 'en', 'es') or a language name ('spanish') and
-    returns a lower-case display name. If the code is 'es' we intentionally
-    return the user-requested string 'spaish'. If we can't resolve the code,
-    return the original input.
+    returns a lower-case display name. If we can't resolve the code, return
+    the original input lowercased.
     """
     if not code_or_name:
         return "unknown"
 
-    s = str(code_or_name).strip()
-    # try to normalize to a code first
-    code = None
-    s_lower = s.lower()
-    if s_lower in _SUPPORTED_CODES or (len(s_lower) == 2 and s_lower.isalpha()):
+    s_lower = str(code_or_name).strip().lower()
+    code = _CODE_INDEX.get(s_lower)
+    if not code and len(s_lower) == 2 and s_lower.isalpha():
         code = s_lower
-    else:
-        code = language_name_to_code(s)
-
+    if not code:
+        code = language_name_to_code(s_lower)
     if not code:
         # couldn't normalize — return the original input lowercased
         return s_lower
-
-    # prefer an ASCII/English-looking name for the code
-    for name, c in _LANG_NAME_TO_CODE.items():
-        if c.lower() == code and all(ord(ch) < 128 for ch in name):
-            return name.lower()
-
-    # fallback to any matching mapping
-    for name, c in _LANG_NAME_TO_CODE.items():
-        if c.lower() == code:
-            return name.lower()
-
     # last resort: return the code itself
-    return code
+    return _DISPLAY_NAME.get(code, code)
 
 def _extract_header(formatted: str) -> Tuple[str, str]:
-    if not formatted:
-        return "", ""
-    parts = formatted.split("\n\n", 1)
-    if len(parts) == 2 and "—" in parts[0]:
-        # The provider may include a decorative underline (e.g. a line of
-        # dashes) directly under the "Title — Artist" line. Remove any
-        # lines that consist only of punctuation/whitespace so the header
-        # becomes just the canonical title/artist string.
-        header_block = parts[0].strip()
-        header_lines = [ln for ln in header_block.splitlines() if not re.match(r'^[\-\s]+$', ln)]
-        header = header_lines[0].strip() if header_lines else header_block.splitlines()[0].strip()
-        return header, parts[1].strip()
-    return "", formatted.strip()
-
-def detect_language(formatted_or_text: str) -> str:
+    return lyrics_text.split_formatted(formatted)
+
+def detect_language(formatted_or_text) -> str:
     """
-    Detect language of provided lyrics or formatted string using the same
-    Google Translate endpoint (no extra deps). Returns ISO code (e.g. 'en', 'es')
-    or 'unknown' on failure.
+    Detect the language of lyrics (a Lyrics object, or a formatted string or
+    plain text) offline with api.langid. Returns a code as used here (e.g.
+    'en', 'es', 'ja') or 'unknown' if it can't tell.
     """
-    try:
-        # reuse header extractor if present
-        header, body = _extract_header(formatted_or_text)
-    except Exception:
-        body = formatted_or_text or ""
-
-    body = (body or "").strip()
-    if not body:
-        return "unknown"
-
-    # use a short sample for detection to avoid huge requests
-    sample = body.split("\n\n", 1)[0][:4000]
-    params = {"client": "gtx", "sl": "auto", "tl": "en", "dt": "t", "q": sample}
+    if isinstance(formatted_or_text, Lyrics):
+        return formatted_or_text.language or langid.detect(formatted_or_text.lines) or "unknown"
+    header, body = _extract_header(formatted_or_text or "")
+    return langid.detect(body) or "unknown"
 
-    try:
-        resp = requests.get(GOOGLE_TRANSLATE_URL, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        # Typical response shape: [ [[...]], null, "detected_lang", ... ]
-        if isinstance(data, list) and len(data) >= 3 and isinstance(data[2], str):
-            return data[2]
-        # fallback for other shapes
-        if isinstance(data, dict):
-            return data.get("src", "unknown")
-    except Exception:
-        return "unknown"
-
-    return "unknown"
+def same_language(source: Optional[str], target: Optional[str]) -> bool:
+    """
+    True if lyrics in `source` need no translating into `target`. Both may
+    be codes or names; Chinese scripts count as different languages, and a
+    bare "zh" matches neither.
+    """
+    if not source or not target:
+        return False
+    if "zh" in (source.strip().casefold(), target.strip().casefold()):
+        return False
+    source_code = language_name_to_code(source) or source
+    target_code = language_name_to_code(target) or target
+    return source_code.casefold() == target_code.casefold()
 
-def _translate_paragraph(paragraph: str, target_lang: str) -> str:
-    if not paragraph.strip():
-        return ""
-    params = {
+def _translation_params(text: str, target_lang: str) -> dict:
+    return {
         "client": "gtx",
         "sl": "auto",
         "tl": target_lang,
         "dt": "t",
-        "q": paragraph
+        "q": text
     }
-    resp = requests.get(GOOGLE_TRANSLATE_URL, params=params, timeout=10)
-    resp.raise_for_status()
+
+def _parse_translation(resp) -> Optional[str]:
     try:
         data = resp.json()
     except Exception:
         # Response was not valid JSON (rate limit page, empty body, etc.).
-        # Let caller fall back; return the original paragraph so output stays usable.
-        return paragraph
+        return None
 
     # defensive: ensure the expected shape exists
     try:
         segments = data[0]
-        translated = "".join(seg[0] for seg in segments if seg and len(seg) > 0 and seg[0])
+        return "".join(seg[0] for seg in segments if seg and len(seg) > 0 and seg[0])
     except Exception:
-        # Unexpected response shape — return original paragraph
+        return None
+
+def _fetch_translation(text: str, target_lang: str) -> Optional[str]:
+    """
+    Send `text` to the translate endpoint and return the joined translation,
+    or None if the response wasn't in the expected shape. HTTP errors raise.
+    """
+    resp = transport.get(GOOGLE_TRANSLATE_URL, params=_translation_params(text, target_lang), timeout=10)
+    resp.raise_for_status()
+    return _parse_translation(resp)
+
+async def _afetch_translation(text: str, target_lang: str) -> Optional[str]:
+    resp = await async_transport.get(GOOGLE_TRANSLATE_URL, params=_translation_params(text, target_lang), timeout=10)
+    resp.raise_for_status()
+    return _parse_translation(resp)
+
+def _cache_key(text: str, target_lang: str) -> str:
+    # NFC + collapsed whitespace within each line so trivially different
+    # copies of a line share an entry. Line breaks are kept: a block of lines
+    # and the same words on one line are translated differently.
+    lines = unicodedata.normalize("NFC", text).strip().splitlines()
+    normalized = "\n".join(" ".join(line.split()) for line in lines)
+    return f"{target_lang.lower()}\x1f{normalized}"
+
+@trace.traced("translate.paragraph")
+def _translate_paragraph(paragraph: str, target_lang: str) -> str:
+    if not paragraph.strip():
+        return ""
+    key = _cache_key(paragraph, target_lang)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    translated = _fetch_translation(paragraph, target_lang)
+    if translated is None:
+        # Let caller fall back; return the original paragraph so output stays usable.
         return paragraph
+    cache.set(key, translated)
     return translated
 
-def translate_song(lyrics: str, target_language: str) -> str:
-    header, body = _extract_header(lyrics)
-    # split into paragraphs (preserve paragraphs separated by one or more blank lines)
-    paragraphs = [p for p in re.split(r'\n{2,}', body) if p.strip()]
+def _encode_line(line: str) -> str:
+    # Newlines are the batch delimiter, so a line must never contain one.
+    return " ".join(line.split())
+
+def _chunk_lines(lines: List[str], max_chars: int = MAX_QUERY_CHARS) -> List[List[str]]:
+    """
+    Group lines into batches whose newline-joined, URL-encoded text stays under
+    `max_chars`. A single line longer than the limit gets a batch of its own.
+    """
+    chunks = []
+    chunk = []
+    size = 0
+    for line in lines:
+        # +3 for the "%0A" that joins this line to the previous one
+        line_size = len(quote(line, safe="")) + (3 if chunk else 0)
+        if chunk and size + line_size > max_chars:
+            chunks.append(chunk)
+            chunk = []
+            size = 0
+            line_size -= 3
+        chunk.append(line)
+        size += line_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def _split_batch(lines: List[str], translated: Optional[str]):
+    """
+    Split a batch answer back into lines. Returns (parts, None), or
+    (None, halves) when the line count didn't survive and each half has to
+    be retried on its own.
+    """
+    if translated is not None:
+        parts = translated.split("\n")
+        if len(parts) == len(lines):
+            return [part.strip() or None for part in parts], None
+    if len(lines) == 1:
+        return [translated.strip() if translated and translated.strip() else None], None
+    mid = len(lines) // 2
+    return None, (lines[:mid], lines[mid:])
+
+@trace.traced("translate.batch")
+def _translate_batch(lines: List[str], target_lang: str) -> List[Optional[str]]:
+    """
+    Translate a batch of non-empty, single-line strings with one request.
+
+    Google keeps newlines in place, so the lines are joined with "\n" and the
+    answer is split on "\n" again. If the line count doesn't survive the round
+    trip (e.g. the translator merged two lines) the batch is halved and each
+    half retried, down to one line per request. Lines that still couldn't be
+    translated come back as None.
+    """
+    parts, halves = _split_batch(lines, _fetch_translation("\n".join(lines), target_lang))
+    if parts is not None:
+        return parts
+    return [text for half in halves for text in _translate_batch(half, target_lang)]
+
+@trace.traced("translate.batch")
+async def _atranslate_batch(lines: List[str], target_lang: str) -> List[Optional[str]]:
+    # asyncio is only imported by the async variants; see api/async_transport.py.
+    import asyncio
+
+    parts, halves = _split_batch(lines, await _afetch_translation("\n".join(lines), target_lang))
+    if parts is not None:
+        return parts
+    answers = await asyncio.gather(*(_atranslate_batch(half, target_lang) for half in halves))
+    return [text for answer in answers for text in answer]
+
+def _lookup_lines(lines: List[str], target_lang: str):
+    """
+    Fill in blank and cached lines. Returns (results, missing) where
+    `missing` maps each unique uncached line to the indexes that need it.
+    """
+    results = [""] * len(lines)
+    missing = {}
+    for i, line in enumerate(lines):
+        if not line or not line.strip():
+            continue
+        encoded = _encode_line(line)
+        cached = cache.get(_cache_key(encoded, target_lang))
+        if cached is not None:
+            results[i] = cached
+        else:
+            missing.setdefault(encoded, []).append(i)
+    return results, missing
+
+def _store_batch(results, missing, chunk, translated, target_lang, strict=False) -> None:
+    # `translated` is None if the whole batch failed. Lines that failed fall
+    # back to the original text (None if `strict`) and aren't cached.
+    for source, text in zip(chunk, translated or [None] * len(chunk)):
+        if text is None:
+            text = None if strict else source
+        else:
+            cache.set(_cache_key(source, target_lang), text)
+        for i in missing[source]:
+            results[i] = text
+
+@trace.traced("translate.lines")
+def translate_lines(lines: List[str], target_lang: str, max_chars: int = MAX_QUERY_CHARS,
+                    strict: bool = False) -> List[Optional[str]]:
+    """
+    Translate many lines with as few requests as possible.
+
+    Returns one translation per input line, in order. Blank lines come back
+    as "" without being sent, cached lines are served from the translation
+    cache and repeated lines (choruses) are only sent once. If a batch fails,
+    its lines are returned untranslated so the output is still usable, or
+    as None with `strict`, for callers that keep the result (e.g. packs).
+    """
+    results, missing = _lookup_lines(lines, target_lang)
+    for chunk in _chunk_lines(list(missing), max_chars):
+        try:
+            translated = _translate_batch(chunk, target_lang)
+        except Exception:
+            translated = None
+        _store_batch(results, missing, chunk, translated, target_lang, strict)
+    return results
+
+@trace.traced("translate.lines")
+async def atranslate_lines(lines: List[str], target_lang: str, max_chars: int = MAX_QUERY_CHARS,
+                           strict: bool = False) -> List[Optional[str]]:
+    """
+    Async variant of `translate_lines`; all batches are sent concurrently.
+    """
+    import asyncio
+
+    results, missing = _lookup_lines(lines, target_lang)
+    chunks = _chunk_lines(list(missing), max_chars)
+    answers = await asyncio.gather(
+        *(_atranslate_batch(chunk, target_lang) for chunk in chunks), return_exceptions=True
+    )
+    for chunk, translated in zip(chunks, answers):
+        if isinstance(translated, BaseException):
+            translated = None
+        _store_batch(results, missing, chunk, translated, target_lang, strict)
+    return results
+
+_PARAGRAPH_BREAK = re.compile(r'\n{2,}')
+
+@trace.traced("translate.song")
+def translate_song(lyrics, target_language: str) -> str:
+    """
+    Translate a whole song paragraph by paragraph, keeping its header.
+    `lyrics` is a Lyrics object or a formatted "Title — Artist" string.
+    """
+    if isinstance(lyrics, Lyrics):
+        header = lyrics.header if lyrics.title else ""
+        paragraphs = ["\n".join(p) for p in lyrics.paragraph_lines()]
+    else:
+        header, body = _extract_header(lyrics)
+        # split into paragraphs (preserve paragraphs separated by one or more blank lines)
+        paragraphs = [p for p in _PARAGRAPH_BREAK.split(body) if p.strip()]
 
     translated_parts = []
     for p in paragraphs:
@@ -303,3 +563,56 @@ def translate_song(lyrics: str, target_language: str) -> str:
         translated_formatted = translated_body
 
     return translated_formatted
+
+
+# Number of background threads used to translate lyrics ahead of the quiz.
+PREFETCH_WORKERS = 4
+# The first batch is kept small so the opening lines are ready almost at once;
+# the rest of the song is sent in full-size batches.
+PREFETCH_FIRST_BATCH = 4
+
+@trace.traced("translate.prefetch_batch")
+def _resolve_batch(futures: List[Future], lines: List[str], target_lang: str, strict: bool = False) -> None:
+    # Skip lines whose future was cancelled (the player quit early).
+    live = [(f, line) for f, line in zip(futures, lines) if f.set_running_or_notify_cancel()]
+    if not live:
+        return
+    try:
+        translated = translate_lines([line for _, line in live], target_lang, strict=strict)
+    except Exception:
+        translated = [None if strict else line for _, line in live]
+    for (future, line), text in zip(live, translated):
+        future.set_result(text if strict else text or line)
+
+def prefetch_translations(lines: List[str], target_lang: str, max_workers: int = PREFETCH_WORKERS,
+                          strict: bool = False) -> List[Future]:
+    """
+    Start translating every line in the background and return one future per
+    line, in the same order as `lines`.
+
+    Lines are sent in batches through `translate_lines`, so a whole song costs
+    only a handful of requests. The caller reads answers with
+    `future.result()`, which only blocks if that particular line hasn't been
+    translated yet. Call `cancel()` on the remaining futures when quitting
+    early so queued work is dropped. With `strict`, lines that couldn't be
+    translated resolve to None instead of the original line.
+    """
+    futures = [Future() for _ in lines]
+    if not lines:
+        return futures
+
+    head = PREFETCH_FIRST_BATCH
+    batches = [(0, lines[:head])]
+    start = head
+    for chunk in _chunk_lines([_encode_line(line) for line in lines[head:]]):
+        batches.append((start, chunk))
+        start += len(chunk)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lyringo-translate")
+    for start, chunk in batches:
+        if chunk:
+            executor.submit(trace.propagate(_resolve_batch), futures[start:start + len(chunk)], chunk, target_lang,
+                            strict)
+    # Let the workers drain the queue on their own; we don't wait here.
+    executor.shutdown(wait=False)
+    return futures
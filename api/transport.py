@@ -0,0 +1,155 @@
+import threading
+from typing import TYPE_CHECKING, Dict
+from urllib.parse import urlsplit
+
+from api import trace
+
+if TYPE_CHECKING:
+    import requests
+
+# requests (and urllib3 under it) is imported when the first session is set
+# up rather than with this module, so code paths that never go online, like
+# starting the game or playing from a song pack, don't pay for it.
+
+# (connect, read) timeout in seconds for requests that don't pass their own.
+DEFAULT_TIMEOUT = (5, 15)
+
+# Connection pools: one per host (Spotify accounts/API, Genius, Google) with
+# enough connections for the thread pools that prefetch and probe.
+POOL_CONNECTIONS = 8
+POOL_MAXSIZE = 16
+
+# Retry connection errors, timeouts and throttling with exponential backoff
+# (0.5 s, 1 s, 2 s). A 429/503 with a Retry-After header waits that long
+# instead, up to MAX_RETRY_AFTER. These are urllib3 Retry arguments.
+RETRY_POLICY = dict(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET", "POST"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+# Never sleep longer than this for a single Retry-After (shared with the
+# async transport), so a server asking for an hour can't freeze the game.
+MAX_RETRY_AFTER = 30
+
+_adapter = None
+_adapter_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+_stats: Dict[str, dict] = {}
+_stats_lock = threading.Lock()
+
+
+def record_latency(url: str, seconds: float, status_code: int) -> None:
+    """Add one finished request to the per-host stats."""
+    host = urlsplit(url).netloc
+    with _stats_lock:
+        entry = _stats.setdefault(host, {"count": 0, "total": 0.0, "max": 0.0, "errors": 0})
+        entry["count"] += 1
+        entry["total"] += seconds
+        entry["max"] = max(entry["max"], seconds)
+        if status_code >= 400:
+            entry["errors"] += 1
+
+
+def _record_latency(response, *args, **kwargs):
+    record_latency(response.url, response.elapsed.total_seconds(), response.status_code)
+    if trace.enabled():
+        # urllib3 keeps the retries that led to this response on `raw`.
+        retries = getattr(response.raw, "retries", None)
+        parts = urlsplit(response.url)
+        trace.event(f"http {parts.netloc}", response.elapsed.total_seconds(), method=response.request.method,
+                    path=parts.path, status=response.status_code, bytes=len(response.content),
+                    retries=len(retries.history) if retries else 0)
+
+
+def _get_adapter():
+    global _adapter
+    if _adapter is None:
+        with _adapter_lock:
+            if _adapter is None:
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                class _CappedRetry(Retry):
+                    """A Retry that waits at most MAX_RETRY_AFTER for a Retry-After."""
+
+                    def get_retry_after(self, response):
+                        seconds = super().get_retry_after(response)
+                        return None if seconds is None else min(seconds, MAX_RETRY_AFTER)
+
+                _adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                                       max_retries=_CappedRetry(**RETRY_POLICY))
+    return _adapter
+
+
+def _new_session() -> "requests.Session":
+    import requests
+
+    class _TimeoutSession(requests.Session):
+        """A Session that applies DEFAULT_TIMEOUT when a call doesn't set one."""
+
+        def request(self, method, url, **kwargs):
+            if kwargs.get("timeout") is None:
+                kwargs["timeout"] = DEFAULT_TIMEOUT
+            return super().request(method, url, **kwargs)
+
+    return _TimeoutSession()
+
+
+def configure(session: "requests.Session") -> "requests.Session":
+    """
+    Give an existing session (e.g. the one lyricsgenius creates) the shared
+    connection pools, retry policy and latency bookkeeping, keeping its own
+    headers.
+    """
+    adapter = _get_adapter()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if _record_latency not in session.hooks["response"]:
+        session.hooks["response"].append(_record_latency)
+    return session
+
+
+def get_session() -> "requests.Session":
+    """Return the process-wide session shared by all api modules."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = configure(_new_session())
+    return _session
+
+
+def get(url, **kwargs) -> "requests.Response":
+    return get_session().get(url, **kwargs)
+
+
+def post(url, **kwargs) -> "requests.Response":
+    return get_session().post(url, **kwargs)
+
+
+def latency_stats() -> Dict[str, dict]:
+    """
+    Per-host request counts and latencies since start-up or the last
+    reset_stats(). Latency is the time until the final response headers
+    arrived, so it includes any retries and backoff.
+    """
+    with _stats_lock:
+        return {
+            host: {
+                "count": s["count"],
+                "errors": s["errors"],
+                "mean_ms": round(1000 * s["total"] / s["count"], 1) if s["count"] else 0.0,
+                "max_ms": round(1000 * s["max"], 1),
+            }
+            for host, s in _stats.items()
+        }
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark drawing quiz boxes with `cli.print_in_box`.
+
+Compares the previous renderer, which called print() once per box line, with
+the buffered one that writes each box in one call. Output goes to a
+discarded buffer, so only the rendering and the write calls are timed. Run
+from the repository root:
+
+    python -m benchmarks.bench_cli --frames 20000
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import cli
+from api import lyrics
+from benchmarks.bench_lyrics import load_fixtures
+
+
+class CountingSink(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+
+def legacy_print_in_box(text, side_pad=1, ver_pad=1):
+    # The renderer print_in_box had before: len()-based widths, one print per line.
+    def print_line(line):
+        texts = [line]
+        if len(line) > cli.MAGIC_LEN - 2 - side_pad:
+            texts, current, used = [], "", 0
+            for word in line.split():
+                used += len(word) + 1
+                if used > cli.MAGIC_LEN - 2 - side_pad:
+                    texts.append(current)
+                    current, used = "", 0
+                current += word + " "
+            texts.append(current)
+        for t in texts:
+            t = t.strip()
+            pre = "|" + " " * side_pad
+            print(pre + t + (cli.MAGIC_LEN - len(t) - 1 - len(pre)) * " " + "|")
+
+    print(cli.BOX_HORIZONTAL)
+    for _ in range(ver_pad):
+        print("|" + " " * (cli.MAGIC_LEN - 2) + "|")
+    for line in [text] if isinstance(text, str) else text:
+        print_line(line)
+    for _ in range(ver_pad):
+        print("|" + " " * (cli.MAGIC_LEN - 2) + "|")
+    print(cli.BOX_HORIZONTAL)
+
+
+def frames(n):
+    # What one quiz shows per line: the original, then answer and verdict.
+    lines = [line for raw in load_fixtures().values() for line in lyrics.clean(raw)[1]]
+    for i in range(n):
+        line = lines[i % len(lines)]
+        yield f"Original: {line}" if i % 2 else [f"Answer: {line}", "Close (80%)"]
+
+
+def run(render, boxes):
+    sink = CountingSink()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        for box in boxes:
+            render(box)
+    return time.perf_counter() - start, sink.writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=20000, help="boxes to draw per renderer")
+    args = parser.parse_args()
+
+    boxes = list(frames(args.frames))
+    print(f"{args.frames} boxes (us per box, write calls per box)")
+    for label, render in (("legacy", legacy_print_in_box), ("buffered", cli.print_in_box)):
+        cli._render_box.cache_clear()
+        cli.display_width.cache_clear()
+        elapsed, writes = run(render, boxes)
+        print(f"  {label:<9}: {elapsed / args.frames * 1e6:7.2f} us  {writes / args.frames:5.1f} writes")
+    elapsed, writes = run(lambda _: cli.welcome(), range(args.frames))
+    print(f"  {'welcome':<9}: {elapsed / args.frames * 1e6:7.2f} us  {writes / args.frames:5.1f} writes (cached screen)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Replay scripted games through `game.GameEngine` against local stubs.
+
+Every game runs the real state machine (select song -> fetch lyrics ->
+choose language -> quiz) with a `ScriptedIO` instead of a terminal, so a
+whole session costs only the engine's own work plus the stub round trips.
+Run from the repository root:
+
+    python -m benchmarks.bench_game --games 1000 --latency 0 --profile
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import time
+
+# Keep the benchmark away from the user's on-disk caches and credentials.
+os.environ["LYRINGO_CACHE_DIR"] = ""
+os.environ.setdefault("GENIUS_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "benchmark")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "benchmark")
+
+import api.genius as genius_client
+import api.lyrics_index as lyrics_index
+import api.spotify as spotify_client
+import api.translate as translate_client
+import game
+from benchmarks.stubs import FakeGenius, FakeSpotify, translate_server
+
+PLAYLIST_LINK = "https://open.spotify.com/playlist/bench"
+
+
+def make_songs(n_tracks: int, n_lines: int):
+    # Every third playlist track has lyrics, the rest are instrumentals, so
+    # the engine has to probe and sometimes resample like with real playlists.
+    songs = {}
+    for i in range(n_tracks):
+        if i % 3:
+            songs[f"Track {i}"] = None
+            continue
+        verses = []
+        for v in range(n_lines // 4):
+            verses.append(f"[Verse {v + 1}]")
+            verses.extend(f"track {i} verse {v} line {n} la la" for n in range(4))
+            verses.append("")
+        songs[f"Track {i}"] = "\n".join(verses)
+    return songs
+
+
+def script(mode: str, title: str, n_lines: int):
+    if mode == "manual":
+        answers = ["2", title, "Stub Artist", "swedish", ""]
+    else:
+        answers = ["1", PLAYLIST_LINK, "swedish", ""]
+    # One answer and one ENTER per line; whatever is left over is unused.
+    return answers + ["ett svar", ""] * n_lines
+
+
+def clear_caches():
+    genius_client.cache.clear()
+    translate_client.cache.clear()
+    spotify_client.playlist_cache.clear()
+    spotify_client._validated_at.clear()
+    lyrics_index.index.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--mode", choices=("playlist", "manual"), default="playlist")
+    parser.add_argument("--tracks", type=int, default=60, help="tracks in the fake playlist")
+    parser.add_argument("--lines", type=int, default=40, help="lyrics lines per song")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per stub response")
+    parser.add_argument("--cold", action="store_true", help="clear the caches before every game")
+    parser.add_argument("--profile", action="store_true", help="print the top functions by cumulative time")
+    args = parser.parse_args()
+
+    songs = make_songs(args.tracks, args.lines)
+    titles = [t for t, lyrics in songs.items() if lyrics]
+    with FakeSpotify(args.tracks, latency=args.latency) as spotify_stub, \
+            FakeGenius(songs, latency=args.latency) as genius_stub, \
+            translate_server(latency=args.latency) as translate_stub:
+        spotify_client.SPOTIFY_API_BASE_URL = spotify_stub.url
+        spotify_client.SPOTIFY_TOKEN_URL = spotify_stub.url + "/api/token"
+        genius_stub.point_client_at_stub(genius_client)
+        translate_client.GOOGLE_TRANSLATE_URL = translate_stub.url + "/translate_a/single"
+
+        profiler = cProfile.Profile() if args.profile else None
+        durations, answered, finished, retries = [], 0, 0, 0
+        start = time.perf_counter()
+        for i in range(args.games):
+            if args.cold:
+                clear_caches()
+            engine = game.GameEngine(game.ScriptedIO(script(args.mode, titles[i % len(titles)], args.lines)))
+            game_start = time.perf_counter()
+            if profiler:
+                profiler.enable()
+            session = engine.run()
+            if profiler:
+                profiler.disable()
+            durations.append(time.perf_counter() - game_start)
+            retries += engine.no_lyrics_rounds
+            if session is not None:
+                answered += len(session.answers)
+                finished += session.done
+        elapsed = time.perf_counter() - start
+        requests = spotify_stub.server.request_count + genius_stub.server.request_count \
+            + translate_stub.request_count
+
+    durations.sort()
+    print(f"{args.games} {args.mode} games ({'cold' if args.cold else 'warm'} caches), "
+          f"{args.lines} lines, {args.latency * 1000:.0f} ms stub latency")
+    print(f"  throughput   : {args.games / elapsed:8.1f} games/s  ({elapsed:.2f} s total)")
+    print(f"  per game     : p50 {durations[len(durations) // 2] * 1000:7.2f} ms   "
+          f"max {durations[-1] * 1000:7.2f} ms")
+    print(f"  finished     : {finished}/{args.games} games, {answered} answers, "
+          f"{retries} no-lyrics retries")
+    print(f"  stub requests: {requests}")
+
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
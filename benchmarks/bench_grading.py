@@ -0,0 +1,60 @@
+"""
+Measure how many quiz answers `grading.score_batch` grades per second.
+
+Answers are generated from the fixture lyrics with typos, dropped accents,
+swapped words or a wrong line altogether, so they look like what players
+type. Run from the
+repository root:
+
+    python -m benchmarks.bench_grading --lines 20000
+"""
+import argparse
+import random
+import time
+
+import grading
+from api import lyrics
+from benchmarks.bench_lyrics import load_fixtures
+
+
+def mangle(line: str, corpus, rng: random.Random) -> str:
+    words = line.split()
+    kind = rng.randrange(5)
+    if kind == 0 and len(words) > 1:
+        i = rng.randrange(len(words) - 1)
+        words[i], words[i + 1] = words[i + 1], words[i]
+    elif kind == 1:
+        word = rng.randrange(len(words))
+        chars = list(words[word])
+        chars[rng.randrange(len(chars))] = rng.choice("aeiou")
+        words[word] = "".join(chars)
+    elif kind == 2:
+        return grading.normalize(line)
+    elif kind == 3:
+        return rng.choice(corpus)
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    corpus = [line for raw in load_fixtures().values() for line in lyrics.clean(raw)[1]]
+    references = [rng.choice(corpus) for _ in range(args.lines)]
+    answers = [mangle(ref, corpus, rng) for ref in references]
+
+    grading.normalize.cache_clear()
+    start = time.perf_counter()
+    scores = grading.score_batch(answers, references)
+    elapsed = time.perf_counter() - start
+    counts = {}
+    for score in scores:
+        counts[grading.verdict(score)] = counts.get(grading.verdict(score), 0) + 1
+    print(f"{args.lines} answers graded in {elapsed:.3f} s: {args.lines / elapsed:,.0f} answers/s")
+    print(f"  verdicts: {counts}")
+
+
+if __name__ == "__main__":
+    main()
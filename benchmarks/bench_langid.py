@@ -0,0 +1,48 @@
+"""
+Micro-benchmark offline language detection over the saved lyrics fixtures.
+
+Times `api.langid.detect` on each song's cleaned lines and checks that it
+names the right language. Detection used to be a Google Translate request
+per song. Run from the repository root:
+
+    python -m benchmarks.bench_langid --rounds 2000
+"""
+import argparse
+import time
+import timeit
+
+from api import langid, lyrics
+from benchmarks.bench_lyrics import load_fixtures
+
+EXPECTED = {
+    "cancion_del_puerto.txt": "es",
+    "paper_lanterns.txt": "en",
+    "sommarregn.txt": "sv",
+    "yoru_no_densha.txt": "ja",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000, help="detections per fixture")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    langid._table()
+    print(f"profile table built in {(time.perf_counter() - start) * 1000:.1f} ms (once per process)")
+
+    print(f"{args.rounds} rounds per fixture (us per call)")
+    wrong = 0
+    for name, raw in load_fixtures().items():
+        lines = lyrics.clean(raw)[1]
+        detected = langid.detect(lines)
+        seconds = timeit.timeit(lambda: langid.detect(lines), number=args.rounds) / args.rounds
+        ok = detected == EXPECTED.get(name, detected)
+        wrong += not ok
+        print(f"  {name:<26} {seconds * 1e6:8.1f} us  {detected or '-':<6} {'ok' if ok else 'WRONG'}")
+    if wrong:
+        raise SystemExit(f"{wrong} fixture(s) detected as the wrong language")
+
+
+if __name__ == "__main__":
+    main()
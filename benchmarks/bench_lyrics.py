@@ -0,0 +1,66 @@
+"""
+Micro-benchmark lyrics cleaning over the saved fixtures in benchmarks/fixtures.
+
+Compares the previous regex-per-pass `clean_lyrics` (plus the separate line
+split the quiz did afterwards) with the single-pass `api.lyrics.clean`.
+Run from the repository root:
+
+    python -m benchmarks.bench_lyrics --rounds 2000
+"""
+import argparse
+import glob
+import os
+import re
+import timeit
+
+from api import lyrics
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def legacy_clean(raw):
+    # The implementation clean_lyrics had before api/lyrics.py, kept for comparison.
+    if not raw:
+        return "", []
+    text = re.sub(r'^\s*\[.*?\]\s*$', '', raw, flags=re.MULTILINE)
+    text = re.sub(r'^\s*\(.*?\)\s*$', '', text, flags=re.MULTILINE)
+    for marker in ["You might also like", "Embed"]:
+        if marker in text:
+            text = text.split(marker)[0]
+    text = re.sub(r'\n\s*\n+', '\n\n', text).strip()
+    return text, [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def load_fixtures():
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            fixtures[os.path.basename(path)] = f.read()
+    return fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000, help="cleanings per fixture and implementation")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    print(f"{len(fixtures)} fixtures, {args.rounds} rounds each (us per call)")
+    print(f"  {'fixture':<26} {'legacy':>9} {'single-pass':>12} {'lines kept':>11}")
+    totals = [0.0, 0.0]
+    for name, raw in fixtures.items():
+        text, lines = lyrics.clean(raw)
+        # The cleaned text must not keep any of the markup it is meant to strip.
+        assert "[" not in text and "Embed" not in text and "You might also like" not in text, name
+        assert "Contributors" not in text, name
+        legacy = timeit.timeit(lambda: legacy_clean(raw), number=args.rounds) / args.rounds
+        single = timeit.timeit(lambda: lyrics.clean(raw), number=args.rounds) / args.rounds
+        totals[0] += legacy
+        totals[1] += single
+        legacy_lines = len(legacy_clean(raw)[1])
+        print(f"  {name:<26} {legacy * 1e6:9.1f} {single * 1e6:12.1f} {len(lines):5d} (legacy {legacy_lines})")
+    print(f"  {'total':<26} {totals[0] * 1e6:9.1f} {totals[1] * 1e6:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Time `get_playlist_by_link` against a local fake Spotify server.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_playlist --tracks 5000 --latency 0.05
+"""
+import argparse
+import os
+import time
+
+# Keep the benchmark away from the user's on-disk caches.
+os.environ["LYRINGO_CACHE_DIR"] = ""
+
+import api.spotify as spotify_client
+from benchmarks.stubs import FakeSpotify
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per stub response")
+    parser.add_argument("--workers", type=int, default=spotify_client.PLAYLIST_FETCH_WORKERS)
+    args = parser.parse_args()
+
+    with FakeSpotify(args.tracks, latency=args.latency) as fake:
+        spotify_client.SPOTIFY_API_BASE_URL = fake.url
+        expected = fake.expected_tracks()
+        print(f"{args.tracks} tracks, {args.latency * 1000:.0f} ms stub latency")
+
+        for label, workers in (("serial", 1), (f"{args.workers} workers", args.workers)):
+            fake.server.reset()
+            start = time.perf_counter()
+            tracks = spotify_client.get_playlist_by_link("token", "spotify:playlist:bench", max_workers=workers, use_cache=False)
+            elapsed = time.perf_counter() - start
+            assert tracks == expected, f"{label}: tracks out of order or missing"
+            print(f"  {label:<12}: {fake.server.request_count:4d} requests  {elapsed:7.3f} s")
+
+        # Picking one random song only needs the size and the chosen page.
+        spotify_client.playlist_cache.clear()
+        fake.server.reset()
+        start = time.perf_counter()
+        song = spotify_client._sample_playlist_tracks("token", "spotify:playlist:bench", 1)
+        elapsed = time.perf_counter() - start
+        assert song and song[0] in expected, "sampled track is not in the playlist"
+        print(f"  {'sampled pick':<12}: {fake.server.request_count:4d} requests  {elapsed:7.3f} s")
+
+        # Once downloaded, an unchanged playlist only costs a snapshot_id check.
+        spotify_client.get_playlist_by_link("token", "spotify:playlist:bench")
+        spotify_client._validated_at.clear()
+        fake.server.reset()
+        start = time.perf_counter()
+        tracks = spotify_client.get_playlist_by_link("token", "spotify:playlist:bench")
+        elapsed = time.perf_counter() - start
+        assert tracks == expected, "cached playlist differs from the downloaded one"
+        print(f"  {'revalidated':<12}: {fake.server.request_count:4d} requests  {elapsed:7.3f} s")
+
+
+if __name__ == "__main__":
+    main()
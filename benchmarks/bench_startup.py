@@ -0,0 +1,119 @@
+"""
+Measure how long Lyringo takes to start, and fail if it got slower.
+
+Three numbers, each the median of several fresh interpreters:
+  - import time of `main`, from `python -X importtime -c "import main"`,
+  - time to banner: launch `main.py` and wait for the welcome box,
+  - which heavy modules `import main` loads; none of HEAVY_MODULES should be,
+    they are imported on first use.
+Exits with status 1 if the import or banner time is over budget or a heavy
+module is imported eagerly. Run from the repository root:
+
+    python -m benchmarks.bench_startup --runs 7 --import-budget-ms 80 --banner-budget-ms 400
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BANNER = b"Welcome to Lyringo!"
+# Modules only some code paths need; starting the game must not import them.
+HEAVY_MODULES = ("lyricsgenius", "bs4", "requests", "urllib3", "httpx", "asyncio")
+
+
+def _env():
+    # Keep the measured runs away from the user's on-disk caches.
+    return dict(os.environ, LYRINGO_CACHE_DIR="", PYTHONDONTWRITEBYTECODE="1")
+
+
+def import_times():
+    """
+    One `-X importtime` run: {module: cumulative microseconds} for `main`
+    and everything imported under it (not the interpreter's own start-up).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=ROOT, env=_env(), capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            # Nesting is shown by indentation; a module is listed after
+            # everything it imported.
+            rows.append((name.strip(), int(cumulative), len(name) - len(name.lstrip()) <= 1))
+    end = next(i for i, (name, _, top) in enumerate(rows) if name == "main" and top)
+    start = end
+    while start > 0 and not rows[start - 1][2]:
+        start -= 1
+    return {name: cumulative for name, cumulative, _ in rows[start:end + 1]}
+
+
+def time_to_banner(timeout: float = 30.0) -> float:
+    """Seconds from launching main.py until the welcome box is printed."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT, env=_env(),
+                            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        seen = b""
+        while BANNER not in seen:
+            chunk = proc.stdout.read1(4096)
+            if not chunk:
+                raise RuntimeError("main.py exited without printing the banner")
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError("timed out waiting for the banner")
+            seen += chunk
+        return time.perf_counter() - start
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def eager_heavy_modules():
+    code = "import sys, main; print(' '.join(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=_env(),
+                            capture_output=True, text=True, check=True)
+    loaded = set(result.stdout.split())
+    return [name for name in HEAVY_MODULES if name in loaded]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--import-budget-ms", type=float, default=80.0,
+                        help="fail if `import main` takes longer than this (median)")
+    parser.add_argument("--banner-budget-ms", type=float, default=400.0,
+                        help="fail if the banner takes longer than this to appear (median)")
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    import_ms = statistics.median(r["main"] for r in runs) / 1000
+    modules = {name: statistics.median(r.get(name, 0) for r in runs) / 1000 for name in runs[0] if name != "main"}
+    banner_ms = statistics.median(time_to_banner() for _ in range(args.runs)) * 1000
+    eager = eager_heavy_modules()
+
+    print(f"startup over {args.runs} runs (median)")
+    print(f"  import main    : {import_ms:7.1f} ms  (budget {args.import_budget_ms:.0f} ms)")
+    print(f"  time to banner : {banner_ms:7.1f} ms  (budget {args.banner_budget_ms:.0f} ms)")
+    print("  slowest imports under main (cumulative):")
+    for name, ms in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"    {name:<36} {ms:7.1f} ms")
+
+    failures = []
+    if import_ms > args.import_budget_ms:
+        failures.append(f"import main took {import_ms:.1f} ms")
+    if banner_ms > args.banner_budget_ms:
+        failures.append(f"the banner took {banner_ms:.1f} ms")
+    if eager:
+        failures.append(f"imported at start-up: {', '.join(eager)}")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare per-line translation requests with batched `translate_lines`.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_translate_lines --lines 60 --latency 0.05
+"""
+import argparse
+import math
+import os
+import time
+from urllib.parse import quote
+
+# Keep the benchmark away from the user's on-disk caches.
+os.environ["LYRINGO_CACHE_DIR"] = ""
+
+import api.translate as translate_client
+from benchmarks.stubs import fake_translation, translate_server
+
+
+def make_song(n: int):
+    return [f"line {i} of the song, la la la" for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per stub response")
+    args = parser.parse_args()
+
+    lines = make_song(args.lines)
+    with translate_server(latency=args.latency) as server:
+        translate_client.GOOGLE_TRANSLATE_URL = server.url + "/translate_a/single"
+
+        start = time.perf_counter()
+        per_line = [translate_client._translate_paragraph(line, "sv") for line in lines]
+        per_line_time = time.perf_counter() - start
+        per_line_requests = server.request_count
+
+        translate_client.cache.clear()
+        server.reset()
+        start = time.perf_counter()
+        batched = translate_client.translate_lines(lines, "sv")
+        batched_time = time.perf_counter() - start
+        batched_requests = server.request_count
+
+        # Replaying the same song should be served entirely from the cache.
+        server.reset()
+        start = time.perf_counter()
+        replayed = translate_client.translate_lines(lines, "sv")
+        replay_time = time.perf_counter() - start
+        replay_requests = server.request_count
+
+    expected = [fake_translation(line, "sv") for line in lines]
+    assert per_line == expected, "per-line translations came back wrong"
+    assert batched == expected, "batched translations were split back incorrectly"
+    assert replayed == expected, "cached translations differ from fresh ones"
+    # Every batch holds at least as many lines as fit in one query even if
+    # they were all as long as the longest one ("%0A" joins them).
+    batch_size = translate_client.MAX_QUERY_CHARS // max(len(quote(line, safe="")) + 3 for line in lines)
+    assert batched_requests <= math.ceil(len(lines) / batch_size), \
+        f"{batched_requests} requests for {len(lines)} lines; batching regressed"
+    assert replay_requests == 0, f"replaying a cached song sent {replay_requests} requests"
+
+    print(f"{args.lines} lines, {args.latency * 1000:.0f} ms stub latency")
+    print(f"  per line : {per_line_requests:4d} requests  {per_line_time:7.3f} s")
+    print(f"  batched  : {batched_requests:4d} requests  {batched_time:7.3f} s")
+    print(f"  replayed : {replay_requests:4d} requests  {replay_time:7.3f} s  (cache {translate_client.cache.stats()})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Load-test the game server against local stub backends.
+
+Starts a fake Genius and a fake translate endpoint, runs `server.GameServer`
+in-process and lets many simulated players create a session and answer every
+line as fast as they can. The players run in the same process as the server,
+so the numbers are a lower bound. Run from the repository root:
+
+    python -m benchmarks.loadgen --sessions 500 --concurrency 50 --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+# Keep the benchmark away from the user's on-disk caches.
+os.environ["LYRINGO_CACHE_DIR"] = ""
+os.environ.setdefault("GENIUS_ACCESS_TOKEN", "benchmark")
+
+import httpx
+
+import api.genius as genius_client
+import api.translate as translate_client
+from benchmarks.stubs import FakeGenius, translate_server
+from server import GameServer
+
+
+def make_songs(n_songs: int, n_lines: int):
+    songs = {}
+    for s in range(n_songs):
+        verses = []
+        for v in range(n_lines // 4):
+            verses.append(f"[Verse {v + 1}]")
+            verses.extend(f"song {s} verse {v} line {i} oh oh" for i in range(4))
+            verses.append("")
+        songs[f"Song {s}"] = "\n".join(verses)
+    return songs
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def play(client, base_url, titles, create_latencies, answer_latencies):
+    start = time.perf_counter()
+    resp = await client.post(f"{base_url}/sessions", json={
+        "title": random.choice(titles), "artist": "Stub Artist", "language": "swedish",
+    })
+    create_latencies.append(time.perf_counter() - start)
+    resp.raise_for_status()
+    state = resp.json()
+    while not state["done"]:
+        start = time.perf_counter()
+        resp = await client.post(f"{base_url}/sessions/{state['session']}/answer", json={"answer": "hej"})
+        answer_latencies.append(time.perf_counter() - start)
+        resp.raise_for_status()
+        state = resp.json()
+    await client.delete(f"{base_url}/sessions/{state['session']}")
+
+
+async def run(args):
+    songs = make_songs(args.songs, args.lines)
+    with FakeGenius(songs, latency=args.latency) as genius_stub, translate_server(latency=args.latency) as translate_stub:
+        genius_stub.point_client_at_stub(genius_client)
+        translate_client.GOOGLE_TRANSLATE_URL = translate_stub.url + "/translate_a/single"
+
+        game_server = GameServer()
+        server = await game_server.start("127.0.0.1", 0)
+        base_url = "http://127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+
+        create_latencies, answer_latencies = [], []
+        semaphore = asyncio.Semaphore(args.concurrency)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            async def one():
+                async with semaphore:
+                    await play(client, base_url, list(songs), create_latencies, answer_latencies)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(args.sessions)))
+            elapsed = time.perf_counter() - start
+            stats = (await client.get(f"{base_url}/stats")).json()
+
+        server.close()
+        await server.wait_closed()
+
+    print(f"{args.sessions} sessions, {args.concurrency} concurrent, {args.songs} songs x {args.lines} lines, "
+          f"{args.latency * 1000:.0f} ms stub latency")
+    print(f"  throughput        : {args.sessions / elapsed:8.1f} sessions/s  ({elapsed:.2f} s total)")
+    print(f"  create session    : p50 {percentile(create_latencies, 50) * 1000:7.1f} ms   "
+          f"p99 {percentile(create_latencies, 99) * 1000:7.1f} ms")
+    print(f"  next-line answer  : p50 {percentile(answer_latencies, 50) * 1000:7.1f} ms   "
+          f"p99 {percentile(answer_latencies, 99) * 1000:7.1f} ms  ({len(answer_latencies)} answers)")
+    print(f"  caches            : {stats['caches']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the game server against local stubs.")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--songs", type=int, default=20)
+    parser.add_argument("--lines", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per stub response")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
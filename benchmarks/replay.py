@@ -0,0 +1,146 @@
+"""
+Record real API responses once and serve them again offline.
+
+A `RecordingProxy` stands in for one upstream (Spotify accounts, Spotify
+API, Genius API, genius.com or Google Translate): it forwards every request
+to the real host and stores the response in a `Fixtures` file. A
+`ReplayServer` later answers the same requests from that file, with the
+stubs' latency and fault settings, so a benchmark recorded against the real
+services can be rerun without network access or credentials.
+
+Responses are keyed by method, path, sorted query and body. Request headers
+(credentials) are forwarded but never stored, and access tokens in recorded
+responses are replaced.
+"""
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+from benchmarks.stubs import StubServer
+
+UPSTREAMS = {
+    "spotify_accounts": "https://accounts.spotify.com",
+    "spotify_api": "https://api.spotify.com",
+    "genius_api": "https://api.genius.com",
+    "genius_web": "https://genius.com",
+    "translate": "https://translate.googleapis.com",
+}
+# Request headers passed on to the real host when recording.
+FORWARD_HEADERS = ("Authorization", "Content-Type", "Accept", "User-Agent")
+FORMAT_VERSION = 1
+
+
+def request_key(method: str, path: str, query: dict, body: str) -> str:
+    key = f"{method} {path}?{urlencode(sorted(query.items()))}"
+    return f"{key}\n{body}" if body else key
+
+
+class Fixtures:
+    """
+    The recorded responses per upstream plus the `inputs` (playlist links,
+    songs, language) the recording run used, stored as one JSON file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.inputs = {}
+        self.responses = {name: {} for name in UPSTREAMS}
+
+    @classmethod
+    def load(cls, path: str) -> "Fixtures":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported fixtures version {data.get('version')!r}")
+        fixtures = cls(path)
+        fixtures.inputs = data.get("inputs", {})
+        fixtures.responses.update(data.get("responses", {}))
+        return fixtures
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "version": FORMAT_VERSION,
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "inputs": self.inputs,
+            "responses": self.responses,
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def count(self) -> int:
+        return sum(len(r) for r in self.responses.values())
+
+
+def _redact(content_type: str, body: str) -> str:
+    # Never write a usable access token into a fixtures file.
+    if "json" not in content_type:
+        return body
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    if isinstance(data, dict) and "access_token" in data:
+        data["access_token"] = "replayed-token"
+        return json.dumps(data)
+    return body
+
+
+class RecordingProxy(StubServer):
+    """Forwards requests to `UPSTREAMS[name]` and records the responses."""
+
+    def __init__(self, name: str, fixtures: Fixtures, timeout: float = 30):
+        super().__init__({})
+        self.name = name
+        self.upstream = UPSTREAMS[name]
+        self.fixtures = fixtures
+        self.timeout = timeout
+
+    def handle(self, method, path, query, body, headers):
+        url = self.upstream + path + (f"?{urlencode(query)}" if query else "")
+        forward = {h: headers[h] for h in FORWARD_HEADERS if headers.get(h)}
+        request = urllib.request.Request(url, data=body.encode("utf-8") if body else None,
+                                         headers=forward, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, content_type = response.status, response.headers.get("Content-Type", "")
+                text = response.read().decode("utf-8", errors="replace")
+        except urllib.error.HTTPError as e:
+            status, content_type = e.code, e.headers.get("Content-Type", "")
+            text = e.read().decode("utf-8", errors="replace")
+        # Throttling and server errors are not worth replaying.
+        if status != 429 and status < 500:
+            self.fixtures.responses[self.name][request_key(method, path, query, body)] = {
+                "status": status, "content_type": content_type, "body": _redact(content_type, text),
+            }
+        return status, text, {"Content-Type": content_type or "text/plain"}
+
+
+class ReplayServer(StubServer):
+    """
+    Serves the responses recorded for upstream `name`. Requests that were
+    never recorded get a 404 and are counted in `misses`.
+    """
+
+    def __init__(self, name: str, fixtures: Fixtures, latency: float = 0.0, **faults):
+        super().__init__({}, latency=latency, **faults)
+        self.name = name
+        self.responses = fixtures.responses.get(name, {})
+        self.misses = 0
+
+    def handle(self, method, path, query, body, headers):
+        recorded = self.responses.get(request_key(method, path, query, body))
+        if recorded is None:
+            with self._lock:
+                self.misses += 1
+            print(f"replay: no recorded {self.name} response for {method} {path}", file=sys.stderr)
+            return 404, {"error": "not recorded"}
+        return recorded["status"], recorded["body"], {"Content-Type": recorded["content_type"] or "text/plain"}
@@ -0,0 +1,301 @@
+"""
+Run Lyringo's benchmark scenarios and write the results as JSON.
+
+Scenarios, each repeated --repeat times with cold caches:
+  playlist_fetch   download a whole playlist (100, 1k and 10k tracks with stubs)
+  lyrics_fetch     look up and clean the lyrics of several songs on Genius
+  translate_song   translate every line of those songs
+
+By default the services are the generated stubs from benchmarks/stubs.py,
+with --latency, --error-rate and --throttle-rate applied. --record FILE runs
+the scenarios once against the real services (credentials from .env, inputs
+from --playlist/--song) and saves every response; --replay FILE serves those
+responses again, offline. --output writes the results as JSON and --compare
+prints the change against an earlier results file. Run from the repository
+root:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --latency 0.05 --error-rate 0.02 --throttle-rate 0.01
+    python -m benchmarks.run --record fixtures.json --playlist <link> --song "Title|Artist"
+    python -m benchmarks.run --replay fixtures.json --compare results.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import ExitStack
+
+# Keep the benchmark away from the user's on-disk caches. Credentials come
+# from .env when recording; the stubs accept anything.
+os.environ["LYRINGO_CACHE_DIR"] = ""
+from api import config
+
+config.load()
+os.environ.setdefault("GENIUS_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "benchmark")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "benchmark")
+
+import api.genius as genius_client
+import api.spotify as spotify_client
+import api.translate as translate_client
+from api import lyrics
+from benchmarks.replay import UPSTREAMS, Fixtures, RecordingProxy, ReplayServer
+from benchmarks.stubs import FakeGenius, FakeSpotify, fake_translation, point_genius_at, translate_server
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+PLAYLIST_SIZES = (100, 1000, 10000)
+RESULTS_VERSION = 1
+
+
+def point_clients(urls: dict) -> None:
+    """Send every api module to the servers in `urls` (keyed like UPSTREAMS)."""
+    spotify_client.SPOTIFY_TOKEN_URL = urls["spotify_accounts"] + "/api/token"
+    spotify_client.SPOTIFY_API_BASE_URL = urls["spotify_api"]
+    point_genius_at(genius_client, urls["genius_api"], urls["genius_web"])
+    translate_client.GOOGLE_TRANSLATE_URL = urls["translate"] + "/translate_a/single"
+
+
+def clear_caches():
+    genius_client.cache.clear()
+    translate_client.cache.clear()
+    spotify_client.playlist_cache.clear()
+    spotify_client._validated_at.clear()
+
+
+def fixture_songs():
+    """The saved raw lyrics in benchmarks/fixtures, keyed by a title made from the file name."""
+    songs = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            songs[os.path.basename(path)[:-4].replace("_", " ").title()] = f.read()
+    return songs
+
+
+def measure(name, params, servers, scenario, repeat):
+    """
+    Run `scenario()` (which returns whether the result was right) `repeat`
+    times with cold caches, counting the requests `servers` received.
+    """
+    runs, requests, errors, throttled = [], [], 0, 0
+    ok, failure = True, None
+    for _ in range(repeat):
+        clear_caches()
+        for server in servers:
+            server.reset()
+        start = time.perf_counter()
+        try:
+            ok = bool(scenario()) and ok
+        except Exception as e:
+            ok, failure = False, f"{type(e).__name__}: {e}"
+        runs.append(time.perf_counter() - start)
+        requests.append(sum(s.request_count for s in servers))
+        errors += sum(s.error_count for s in servers)
+        throttled += sum(s.throttle_count for s in servers)
+    result = {
+        "scenario": name,
+        "params": params,
+        "ok": ok,
+        "runs_s": [round(r, 6) for r in runs],
+        "median_s": round(statistics.median(runs), 6),
+        "min_s": round(min(runs), 6),
+        "requests": statistics.median(requests),
+        "injected_errors": errors,
+        "injected_throttles": throttled,
+    }
+    if failure:
+        result["error"] = failure
+    return result
+
+
+def playlist_scenario(token, link, expected=None):
+    def scenario():
+        tracks = spotify_client.get_playlist_by_link(token, link)
+        return tracks == expected if expected is not None else bool(tracks)
+    return scenario
+
+
+def lyrics_scenario(songs, found):
+    def scenario():
+        fetched = [genius_client.get_song(title, artist) for title, artist in songs]
+        found[:] = fetched
+        return all(genius_client.has_lyrics(l) for l in fetched)
+    return scenario
+
+
+def translate_scenario(songs_lines, lang, strict):
+    def scenario():
+        ok = True
+        for lines in songs_lines:
+            translated = translate_client.translate_lines(lines, lang)
+            if strict:
+                ok = ok and translated == [fake_translation(line, lang) for line in lines]
+            else:
+                # Lines that failed come back untranslated.
+                ok = ok and any(t != line for t, line in zip(translated, lines))
+        return ok
+    return scenario
+
+
+def run_stubs(args, faults):
+    results = []
+    for size in args.sizes:
+        with FakeSpotify(size, latency=args.latency, **faults) as spotify:
+            point_clients({**UPSTREAMS, "spotify_accounts": spotify.url, "spotify_api": spotify.url})
+            token = spotify_client.get_token()
+            results.append(measure("playlist_fetch", {"tracks": size}, [spotify.server],
+                                   playlist_scenario(token, f"spotify:playlist:bench-{size}", spotify.expected_tracks()),
+                                   args.repeat))
+
+    raw = fixture_songs()
+    songs = [(title, "Stub Artist") for title in raw]
+    with FakeGenius(raw, latency=args.latency, **faults) as genius:
+        point_clients({**UPSTREAMS, "genius_api": genius.url, "genius_web": genius.url})
+        results.append(measure("lyrics_fetch", {"songs": len(songs)}, [genius.server],
+                               lyrics_scenario(songs, []), args.repeat))
+
+    songs_lines = [lyrics.clean(text)[1] for text in raw.values()]
+    with translate_server(latency=args.latency, **faults) as translate:
+        point_clients({**UPSTREAMS, "translate": translate.url})
+        results.append(measure("translate_song", {"songs": len(songs_lines), "lines": sum(map(len, songs_lines)),
+                                                  "lang": args.lang},
+                               [translate], translate_scenario(songs_lines, args.lang, strict=True), args.repeat))
+    return results
+
+
+def run_recorded(args, faults):
+    """Record against the real services (args.record) or replay a recording."""
+    if args.record:
+        fixtures = Fixtures(args.record)
+        fixtures.inputs = {
+            "playlists": args.playlist,
+            "songs": [song.split("|", 1) if "|" in song else [song, ""] for song in args.song],
+            "lang": args.lang,
+        }
+        # Real services are called once per scenario, without injected faults.
+        repeat = 1
+        make_server = lambda name: RecordingProxy(name, fixtures)
+    else:
+        fixtures = Fixtures.load(args.replay)
+        repeat = args.repeat
+        make_server = lambda name: ReplayServer(name, fixtures, latency=args.latency, **faults)
+    inputs = fixtures.inputs
+    songs = [tuple(song) for song in inputs.get("songs", [])]
+    lang = inputs.get("lang") or args.lang
+
+    results = []
+    with ExitStack() as stack:
+        servers = {name: stack.enter_context(make_server(name)) for name in UPSTREAMS}
+        point_clients({name: server.url for name, server in servers.items()})
+
+        if inputs.get("playlists"):
+            token = spotify_client.get_token()
+            for link in inputs["playlists"]:
+                tracks = spotify_client.get_playlist_by_link(token, link, use_cache=False)
+                results.append(measure("playlist_fetch", {"playlist": spotify_client.extract_playlist_id(link),
+                                                          "tracks": len(tracks)},
+                                       [servers["spotify_api"]], playlist_scenario(token, link), repeat))
+        if songs:
+            found = []
+            results.append(measure("lyrics_fetch", {"songs": len(songs)},
+                                   [servers["genius_api"], servers["genius_web"]],
+                                   lyrics_scenario(songs, found), repeat))
+            songs_lines = [list(l.lines) for l in found if genius_client.has_lyrics(l)]
+            if songs_lines:
+                results.append(measure("translate_song", {"songs": len(songs_lines),
+                                                          "lines": sum(map(len, songs_lines)), "lang": lang},
+                                       [servers["translate"]], translate_scenario(songs_lines, lang, strict=False),
+                                       repeat))
+        misses = sum(getattr(s, "misses", 0) for s in servers.values())
+
+    if args.record:
+        fixtures.save()
+        print(f"recorded {fixtures.count()} responses to {args.record}")
+    elif misses:
+        print(f"warning: {misses} requests had no recorded response", file=sys.stderr)
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(FIXTURES), check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _key(result):
+    return result["scenario"], json.dumps(result["params"], sort_keys=True)
+
+
+def print_results(results, baseline=None):
+    before = {_key(r): r for r in (baseline or {}).get("results", [])}
+    print(f"  {'scenario':<16} {'params':<38} {'median':>9} {'requests':>9}  check"
+          + ("  change vs baseline" if baseline else ""))
+    for r in results:
+        params = ", ".join(f"{k}={v}" for k, v in r["params"].items())
+        line = (f"  {r['scenario']:<16} {params:<38} {r['median_s'] * 1000:7.1f}ms "
+                f"{r['requests']:9.0f}  {'ok' if r['ok'] else 'FAIL':<4}")
+        old = before.get(_key(r))
+        if old and old["median_s"]:
+            line += f"  {old['median_s'] * 1000:7.1f}ms -> x{r['median_s'] / old['median_s']:.2f}"
+        print(line)
+        if r.get("error"):
+            print(f"    {r['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    backend = parser.add_mutually_exclusive_group()
+    backend.add_argument("--record", metavar="FILE", help="run against the real services and save their responses")
+    backend.add_argument("--replay", metavar="FILE", help="serve the responses saved by --record")
+    parser.add_argument("--playlist", action="append", default=[], help="playlist link to record (repeatable)")
+    parser.add_argument("--song", action="append", default=[], help='"Title|Artist" to record (repeatable)')
+    parser.add_argument("--sizes", type=lambda s: [int(n) for n in s.split(",")], default=list(PLAYLIST_SIZES),
+                        help="stub playlist sizes, comma-separated")
+    parser.add_argument("--lang", default="sv", help="target language for translate_song")
+    parser.add_argument("--repeat", type=int, default=3, help="cold runs per scenario")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per stub response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub responses that are 500s")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of stub responses that are 429s")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the injected faults")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+    if args.record and not (args.playlist or args.song):
+        parser.error("--record needs at least one --playlist or --song")
+
+    faults = {"error_rate": args.error_rate, "throttle_rate": args.throttle_rate,
+              "retry_after": args.retry_after, "seed": args.seed}
+    backend_name = "record" if args.record else "replay" if args.replay else "stubs"
+    results = run_recorded(args, faults) if backend_name != "stubs" else run_stubs(args, faults)
+
+    report = {
+        "version": RESULTS_VERSION,
+        "commit": _commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "backend": backend_name,
+        "settings": {"repeat": 1 if args.record else args.repeat, "latency": args.latency, **faults},
+        "results": results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print(f"{backend_name} backend, commit {report['commit']}, {report['settings']['repeat']} cold runs each")
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.output}")
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
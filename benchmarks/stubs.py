@@ -0,0 +1,296 @@
+"""
+Local stand-ins for the HTTP services Lyringo talks to.
+
+Each stub runs a threaded HTTP server on 127.0.0.1 with a random port and
+counts the requests it receives, so benchmarks can measure both wall time and
+how many round trips a code path costs without touching the real APIs.
+
+Every stub takes the same fault settings as `StubServer`: `error_rate` and
+`throttle_rate` answer that share of requests with a 500 or a 429 (with
+`Retry-After: retry_after`, in whole seconds) instead, drawn from a random
+generator seeded with `seed` so runs are repeatable.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubServer:
+    """
+    Minimal routing HTTP server.
+
+    `routes` maps a path prefix to a function `(method, path, query, body)`
+    returning `(status, payload)` or `(status, payload, headers)`. Dict/list
+    payloads are sent as JSON, strings as text/html unless `headers` sets a
+    Content-Type. `latency` seconds are slept before every response.
+    """
+
+    def __init__(self, routes, latency: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: int = 1, seed=0):
+        self.routes = routes
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.request_count = 0
+        self.error_count = 0
+        self.throttle_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset(self):
+        with self._lock:
+            self.request_count = 0
+            self.error_count = 0
+            self.throttle_count = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _dispatch(self, method, raw_path, body, headers):
+        with self._lock:
+            self.request_count += 1
+            roll = self._random.random()
+            throttled = roll < self.throttle_rate
+            failed = not throttled and roll < self.throttle_rate + self.error_rate
+            self.throttle_count += throttled
+            self.error_count += failed
+        if self.latency:
+            time.sleep(self.latency)
+        if throttled:
+            return 429, {"error": "rate limited"}, {"Retry-After": str(self.retry_after)}
+        if failed:
+            return 500, {"error": "injected failure"}, {}
+        parts = urlsplit(raw_path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+        result = self.handle(method, parts.path, query, body, headers)
+        return result if len(result) == 3 else (*result, {})
+
+    def handle(self, method, path, query, body, headers):
+        """Answer one request; subclasses may route differently."""
+        # Longest matching prefix wins so "/v1/playlists/x/tracks" can be
+        # routed separately from "/v1/playlists/x".
+        for prefix in sorted(self.routes, key=len, reverse=True):
+            if path.startswith(prefix):
+                return self.routes[prefix](method, path, query, body)
+        return 404, {"error": "not found"}
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; without this, keep-alive
+            # clients hit the 40 ms delayed-ACK stall on every request.
+            disable_nagle_algorithm = True
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode("utf-8") if length else ""
+                status, payload, headers = stub._dispatch(self.command, self.path, body, self.headers)
+                headers = dict(headers)
+                if isinstance(payload, (dict, list)):
+                    data = json.dumps(payload).encode("utf-8")
+                    headers.setdefault("Content-Type", "application/json")
+                else:
+                    data = str(payload).encode("utf-8")
+                    headers.setdefault("Content-Type", "text/html; charset=utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def fake_translation(text: str, target_lang: str) -> str:
+    return f"[{target_lang}] {text}"
+
+
+def translate_route(method, path, query, body):
+    """
+    Answer like `translate_a/single?dt=t`: one segment per source line, each
+    keeping its trailing newline, followed by the detected source language.
+    """
+    if method == "POST" and body:
+        query = {**query, **{k: v[-1] for k, v in parse_qs(body).items()}}
+    text = query.get("q", "")
+    target = query.get("tl", "en")
+    segments = []
+    for line in text.splitlines(keepends=True):
+        ending = "\n" if line.endswith("\n") else ""
+        source = line[:-1] if ending else line
+        segments.append([fake_translation(source, target) + ending, line, None, None])
+    return 200, [segments, None, "en"]
+
+
+def translate_server(latency: float = 0.0, **faults) -> StubServer:
+    return StubServer({"/translate_a/single": translate_route}, latency=latency, **faults)
+
+
+class FakeSpotify:
+    """
+    Serves `/v1/playlists/<id>/tracks` with `n_tracks` generated tracks,
+    honouring `limit`/`offset` and returning `total` and `next` like Spotify,
+    and `/v1/playlists/<id>` with the playlist's `snapshot_id`. `/api/token`
+    hands out a client-credentials token. Every 10th track is "unavailable"
+    (null), as happens with removed songs.
+    """
+
+    def __init__(self, n_tracks: int, latency: float = 0.0, **faults):
+        self.n_tracks = n_tracks
+        self.snapshot_id = f"snapshot-{n_tracks}"
+        self.server = StubServer({
+            "/v1/playlists/": self.playlist_route,
+            "/api/token": self.token_route,
+        }, latency=latency, **faults)
+
+    @property
+    def url(self) -> str:
+        return self.server.url
+
+    def __enter__(self):
+        self.server.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.stop()
+
+    def track(self, index: int):
+        if index % 10 == 9:
+            return None
+        return {"name": f"Track {index}", "artists": [{"name": f"Artist {index % 37}"}]}
+
+    def expected_tracks(self):
+        return [
+            {"track_name": t["name"], "artist_names": [a["name"] for a in t["artists"]]}
+            for t in (self.track(i) for i in range(self.n_tracks)) if t
+        ]
+
+    def token_route(self, method, path, query, body):
+        return 200, {"access_token": "stub-token", "token_type": "Bearer", "expires_in": 3600}
+
+    def playlist_route(self, method, path, query, body):
+        if not path.endswith("/tracks"):
+            return 200, {"snapshot_id": self.snapshot_id}
+        limit = min(int(query.get("limit", 100)), 100)
+        offset = int(query.get("offset", 0))
+        end = min(offset + limit, self.n_tracks)
+        items = [{"track": self.track(i)} for i in range(offset, end)]
+        next_url = f"{self.url}{path}?offset={end}&limit={limit}" if end < self.n_tracks else None
+        return 200, {"items": items, "total": self.n_tracks, "next": next_url}
+
+
+class FakeGenius:
+    """
+    Serves the three Genius endpoints a lyrics lookup uses: the public
+    `/api/search/multi`, the API's `/songs/<id>` and the song page itself.
+
+    `songs` maps a title to its raw lyrics; None means the song exists but
+    has no lyrics (e.g. an instrumental). Titles not in `songs` aren't found.
+    Song URLs point at genius.com like the real API does; clients are
+    expected to map them onto the stub by path.
+    """
+
+    def __init__(self, songs, latency: float = 0.0, **faults):
+        self.songs = dict(songs)
+        self._ids = {title: i + 1 for i, title in enumerate(self.songs)}
+        self._titles = {i: title for title, i in self._ids.items()}
+        self.server = StubServer({
+            "/api/search/multi": self.search_route,
+            "/songs/": self.song_route,
+            "/": self.page_route,
+        }, latency=latency, **faults)
+
+    @property
+    def url(self) -> str:
+        return self.server.url
+
+    def __enter__(self):
+        self.server.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.stop()
+
+    def _song(self, title):
+        song_id = self._ids[title]
+        slug = "-".join(title.lower().split())
+        return {
+            "id": song_id,
+            "title": title,
+            "url": f"https://genius.com/stub-artist-{slug}-lyrics",
+            "path": f"/stub-artist-{slug}-lyrics",
+            "lyrics_state": "complete",
+            "instrumental": self.songs[title] is None,
+            "primary_artist": {"name": "Stub Artist"},
+            "language": "en",
+        }
+
+    def search_route(self, method, path, query, body):
+        q = query.get("q", "").lower()
+        hits = [{"index": "song", "type": "song", "result": self._song(t)}
+                for t in self.songs if t.lower() in q]
+        return 200, {"response": {"sections": [{"type": "top_hit", "hits": hits[:1]},
+                                               {"type": "song", "hits": hits}]}}
+
+    def song_route(self, method, path, query, body):
+        title = self._titles.get(int(path.rsplit("/", 1)[-1]))
+        if title is None:
+            return 404, {"meta": {"status": 404}}
+        return 200, {"response": {"song": self._song(title)}}
+
+    def page_route(self, method, path, query, body):
+        for title in self.songs:
+            if self._song(title)["path"] == path:
+                lyrics = self.songs[title] or ""
+                html_lines = "<br/>".join(lyrics.splitlines())
+                return 200, (f"<html><body><div class=\"LyricsHeader__Container\">{title} Lyrics</div>"
+                             f"<div data-lyrics-container=\"true\">{html_lines}</div></body></html>")
+        return 404, "<html><body>Page not found</body></html>"
+
+    def point_client_at_stub(self, genius_client):
+        """Route the sync lyricsgenius client and the async lookups here."""
+        point_genius_at(genius_client, self.url, self.url)
+
+
+def point_genius_at(genius_client, api_url: str, web_url: str) -> None:
+    """
+    Send the sync lyricsgenius client and the async lookups to `api_url`
+    (api.genius.com) and `web_url` (genius.com, including its /api/search).
+    """
+    client = genius_client.get_genius()
+    client.API_ROOT = api_url + "/"
+    client.PUBLIC_API_ROOT = web_url + "/api/"
+    client.WEB_ROOT = web_url + "/"
+    genius_client.GENIUS_WEB_URL = web_url
@@ -1,4 +1,7 @@
-from typing import List
+import sys
+import unicodedata
+from functools import lru_cache
+from typing import List, Tuple
 
 LYRINGO_ASCII = r"""
 $$\   $$\     $$\ $$$$$$$\  $$$$$$\ $$\   $$\  $$$$$$\   $$$$$$\  
@@ -13,6 +16,35 @@ $$$$$$$$\ $$ |    $$ |  $$ |$$$$$$\ $$ | \$$ |\$$$$$$  | $$$$$$  |
 
 MAGIC_LEN: int = 66
 BOX_HORIZONTAL: str = "+" + (MAGIC_LEN - 2) * "-" + "+"
+BOX_EMPTY_LINE: str = "|" + " " * (MAGIC_LEN - 2) + "|"
+
+WELCOME_TEXT = (
+    "Welcome to Lyringo!",
+    "Learn new languages by translating your favourite songs.",
+)
+INSTRUCTIONS_TEXT = (
+    "There are two alternatives for selecting a song:",
+    "",
+    "1 - Let Lyringo choose a random song from your playlist.",
+    "2 - Manually search for a song.",
+)
+
+def char_width(ch: str) -> int:
+    """Terminal columns one character takes: 2 for wide CJK/emoji, 0 for combining marks."""
+    if unicodedata.combining(ch) or unicodedata.category(ch) in ("Mn", "Me", "Cf"):
+        return 0
+    return 2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1
+
+@lru_cache(maxsize=4096)
+def display_width(text: str) -> int:
+    """Columns `text` takes in a terminal, unlike len() for CJK and emoji."""
+    if text.isascii():
+        return len(text)
+    return sum(char_width(ch) for ch in text)
+
+def text_width(pad: int = 1) -> int:
+    # Columns left for text between the borders and `pad` spaces on each side.
+    return MAGIC_LEN - 2 - 2 * pad
 
 def print_lyringo():
     print(LYRINGO_ASCII)
@@ -20,90 +52,95 @@ def print_lyringo():
 def pad_line(text: str, pad: int, length: int):
     text = text.strip()
     pre: str = "|" + " " * pad
-    suf: str = (length - len(text) - 1 - len(pre)) * " " + "|"
+    suf: str = (length - display_width(text) - 1 - len(pre)) * " " + "|"
 
     return pre + text + suf
 
-def print_lines(n: int):
-    for _ in range(n):
-        print("|" + " " * (MAGIC_LEN - 2) + "|")
-
 def needs_wrap(text: str | int, pad: int = 1) -> bool:
-    return (len(text) if isinstance(text, str) else text) > (MAGIC_LEN - 2 - pad)
-
-def wrap(text: str) -> List[str]:
+    return (display_width(text) if isinstance(text, str) else text) > text_width(pad)
+
+def _break_word(word: str, width: int) -> List[str]:
+    # Split a word wider than the box into pieces that fit.
+    pieces, piece, used = [], "", 0
+    for ch in word:
+        w = char_width(ch)
+        if used + w > width and piece:
+            pieces.append(piece)
+            piece, used = "", 0
+        piece += ch
+        used += w
+    pieces.append(piece)
+    return pieces
+
+def wrap(text: str, pad: int = 1) -> List[str]:
     """
-    Wraps the given line to fit inside the box
+    Wraps the given line to fit inside the box. Widths are measured in
+    terminal columns, and words too long for one line are broken up.
     """
+    width = text_width(pad)
     res = []
-
-    words = text.split()
-
-    line_len: int = 0
-    line: str = ""
-    for word in words:
-        line_len += len(word) + 1
-        if needs_wrap(line_len):
+    line, used = "", 0
+    for word in text.split():
+        w = display_width(word)
+        if w > width:
+            *whole, word = _break_word(word, width)
+            if line:
+                res.append(line)
+            res.extend(whole)
+            line, used = "", 0
+            w = display_width(word)
+        if line and used + 1 + w > width:
             res.append(line)
-            line = ""
-            line_len = 0
-        line += word + " "
+            line, used = "", 0
+        line = f"{line} {word}" if line else word
+        used += w + (1 if used else 0)
 
     res.append(line)
     return res
 
+@lru_cache(maxsize=1024)
+def _render_box(lines: Tuple[str, ...], side_pad: int, ver_pad: int) -> str:
+    rows = [BOX_HORIZONTAL]
+    rows.extend([BOX_EMPTY_LINE] * ver_pad)
+    for text in lines:
+        for line in (wrap(text, side_pad) if needs_wrap(text, side_pad) else (text,)):
+            rows.append(pad_line(line, side_pad, MAGIC_LEN))
+    rows.extend([BOX_EMPTY_LINE] * ver_pad)
+    rows.append(BOX_HORIZONTAL)
+    return "\n".join(rows)
+
+def render_box(text: str | List[str], side_pad: int = 1, ver_pad: int = 1) -> str:
+    """
+    The box print_in_box prints, as one string without a trailing newline.
+    Boxes are cached, so static screens and repeated lines are only laid
+    out once.
+    """
+    lines = (text,) if isinstance(text, str) else tuple(text)
+    return _render_box(lines, side_pad, ver_pad)
+
 def print_in_box(text: str | List[str], side_pad: int = 1, ver_pad: int = 1):
     """
     Prints text inside a prespecified box with adjustable padding
 
-    To print multiple lines, pass in a list of strings
+    To print multiple lines, pass in a list of strings. The whole box is
+    written to the terminal at once.
     """
+    sys.stdout.write(render_box(text, side_pad, ver_pad) + "\n")
 
-    def print_line(text: str):
-        texts = [text]
-        if needs_wrap(text):
-            texts = wrap(text)
-        
-        for line in texts:
-            print(pad_line(line, side_pad, MAGIC_LEN))
-
-    # TOP LINE
-    print(BOX_HORIZONTAL)
-    print_lines(ver_pad)
-
-    # Text
-    if isinstance(text, str):
-        print_line(text)
-    else:
-        for line in text:
-            print_line(line)
-
-    # BOTTOM LINE
-    print_lines(ver_pad)
-    print(BOX_HORIZONTAL)
+@lru_cache(maxsize=1)
+def welcome_screen() -> str:
+    return "\n".join([LYRINGO_ASCII, render_box(WELCOME_TEXT), render_box(INSTRUCTIONS_TEXT)]) + "\n"
 
 def welcome():
-    print_lyringo()
-    welcome_text = [
-        "Welcome to Lyringo!",
-        "Learn new languages by translating your favourite songs."
-    ]
-    print_in_box(welcome_text)
-
-    instructions_text = [
-        "There are two alternatives for selecting a song:",
-        "",
-        "1 - Let Lyringo choose a random song from your playlist.",
-        "2 - Manually search for a song."
-    ]
-    print_in_box(instructions_text)
-  
+    sys.stdout.write(welcome_screen())
+
 if __name__ == "__main__":
     tip: str  = "2. Try to translate to your chosen language, press ENTER when you are done."
 
     print(wrap(tip))
     print_in_box(tip)
 
-    # TODO, fix this case:
+    # Words longer than a line are broken up instead of overflowing the box.
     s: str  = "j" * (MAGIC_LEN)
-    print_in_box(s)
\ No newline at end of file
+    print_in_box(s)
+    print_in_box("夜の電車に揺られて 君の名前を呼んだ 🌙🚃")
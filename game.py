@@ -0,0 +1,579 @@
+import time
+import uuid
+from concurrent.futures import Future
+from enum import Enum
+from typing import Iterable, List, Optional, Tuple
+
+import api.genius as genius_client
+import api.lyrics_index as lyrics_index
+import api.spotify as spotify_client
+import api.translate as translate_client
+from api import langid, trace
+import cli
+import grading
+
+# How many random playlist songs are searched for lyrics at the same time.
+PROBE_CANDIDATES = 4
+# If none of the sampled songs have lyrics, sample this many rounds before
+# asking the player for another playlist.
+MAX_NO_LYRICS_ROUNDS = 3
+
+
+def resolve_language(user_lang: str) -> Tuple[str, bool]:
+    """
+    Turn what the player typed ("swedish", "sv", ...) into a translate code.
+    Returns (code, recognized); unknown input falls back to English.
+    """
+    user_lang = (user_lang or "").strip()
+    # convert language name like "english" -> "en" using translate_client helper
+    code = translate_client.language_name_to_code(user_lang)
+    if code:
+        return code, True
+    # accept two-letter codes directly
+    if len(user_lang) == 2 and user_lang.isalpha():
+        return user_lang.lower(), True
+    return "en", False
+
+
+def needs_translation(lines: List[str], lyrics_language: Optional[str], language: str) -> bool:
+    """
+    False only if the lyrics are clearly already in `language`, so their
+    lines can be used as they are: strict detection on the lines has to name
+    it, and the recorded language (if any) must agree. Showing the original
+    as the answer to a song in another language is worse than a translate
+    request too many.
+    """
+    if lyrics_language and not translate_client.same_language(lyrics_language, language):
+        return True
+    return not translate_client.same_language(langid.detect(lines, strict=True), language)
+
+
+def parse_languages(text: str) -> List[str]:
+    """
+    Parse a comma separated list of languages ("sv,es" or "swedish, spanish")
+    into unique translate codes. Raises ValueError for an unknown language.
+    """
+    codes = []
+    for name in text.split(","):
+        if not name.strip():
+            continue
+        code, recognized = resolve_language(name)
+        if not recognized:
+            raise ValueError(f"unknown language: {name.strip()}")
+        if code not in codes:
+            codes.append(code)
+    return codes
+
+
+def prepare_song(song: dict, languages: List[str]) -> Optional[dict]:
+    """
+    Fetch a playlist song's lyrics and translate its quiz lines into every
+    language, going through (and so filling) the lyrics and translation
+    caches. Returns None if the song has no lyrics, otherwise a dict with
+    "title", "artist", "header", "language", "lines" and "translations"
+    ({language: [text or None]}). Lines that couldn't be translated are None,
+    never the original text.
+    """
+    artists = song.get("artist_names") or []
+    artist = artists[0] if artists else ""
+    lyrics = genius_client.get_song(song["track_name"], artist)
+    if not genius_client.has_lyrics(lyrics):
+        return None
+    lines = list(lyrics.lines)
+    return {
+        "title": song["track_name"],
+        "artist": artist,
+        "header": lyrics.header,
+        "language": lyrics.language,
+        "lines": lines,
+        "translations": {
+            lang: translate_client.translate_lines(lines, lang, strict=True)
+            if needs_translation(lines, lyrics.language, lang) else list(lines)
+            for lang in languages
+        },
+    }
+
+
+class GameSession:
+    """
+    The state of one game: the chosen song, the lines to translate, the
+    target language and how far the player has come.
+
+    It does no I/O itself, so the terminal game and the server can drive it
+    the same way: show `current_line()`, then `record_answer()` with the
+    player's answer and the expected translation.
+    """
+
+    def __init__(self, song: str, lines: List[str], language: str, lyrics_language: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.song = song
+        self.lines = lines
+        self.language = language
+        self.lyrics_language = lyrics_language
+        self.position = 0
+        self.answers = []
+        self.touched = time.monotonic()
+
+    @property
+    def done(self) -> bool:
+        return self.position >= len(self.lines)
+
+    def current_line(self) -> Optional[str]:
+        return None if self.done else self.lines[self.position]
+
+    def record_answer(self, answer: str, expected: Optional[str]) -> Optional[str]:
+        """
+        Grade and store the answer for the current line and return the next
+        line. A blank answer skips the line (score None), and so does a line
+        with no expected translation (None), which can't be graded.
+        """
+        score = grading.score(answer, expected) if answer and expected is not None else None
+        self.answers.append({
+            "line": self.current_line(),
+            "answer": answer,
+            "expected": expected,
+            "score": score,
+            "verdict": "ungraded" if expected is None else grading.verdict(score),
+        })
+        self.position += 1
+        self.touched = time.monotonic()
+        return self.current_line()
+
+    def results(self) -> dict:
+        """Totals so far: lines answered, correct, and the summed score."""
+        scores = [a["score"] for a in self.answers if a["score"] is not None]
+        return {
+            "answered": len(scores),
+            "correct": sum(1 for s in scores if s >= grading.CORRECT),
+            "score": round(sum(scores), 2),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "session": self.id,
+            "song": self.song,
+            "language": self.language,
+            "index": self.position,
+            "total": len(self.lines),
+            "line": self.current_line(),
+            "done": self.done,
+            **self.results(),
+        }
+
+
+def _is_playlist_link(link: str) -> bool:
+    return "spotify" in link and ("playlist" in link or link.startswith("spotify:"))
+
+
+def _completed(value) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class TerminalIO:
+    """Plays the game with a person at the terminal."""
+
+    def ask(self, prompt: str) -> str:
+        # Its own span so traces can tell the player's thinking time apart
+        # from the stage's own work.
+        with trace.span("io.wait_for_player"):
+            return input(prompt)
+
+    def show(self, text) -> None:
+        cli.print_in_box(text)
+
+    def say(self, text: str = "") -> None:
+        print(text)
+
+    def welcome(self) -> None:
+        cli.welcome()
+
+
+class ScriptedIO:
+    """
+    Plays the game from a script of answers, e.g. for headless benchmarks.
+
+    Each prompt consumes the next answer; running out behaves like the player
+    closing stdin (EOFError). Output is dropped unless `record=True`, in which
+    case everything shown is kept in `output`.
+    """
+
+    def __init__(self, answers: Iterable[str], record: bool = False):
+        self._answers = iter(answers)
+        self.output = [] if record else None
+
+    def ask(self, prompt: str) -> str:
+        try:
+            return next(self._answers)
+        except StopIteration:
+            raise EOFError(prompt) from None
+
+    def show(self, text) -> None:
+        if self.output is not None:
+            self.output.append(text)
+
+    def say(self, text: str = "") -> None:
+        if self.output is not None and text:
+            self.output.append(text)
+
+    def welcome(self) -> None:
+        pass
+
+
+class State(Enum):
+    SELECT_SONG = "select song"
+    FETCH_LYRICS = "fetch lyrics"
+    CHOOSE_LANGUAGE = "choose language"
+    QUIZ = "quiz lines"
+    DONE = "done"
+
+
+class GameEngine:
+    """
+    One game as a state machine:
+
+        SELECT_SONG -> FETCH_LYRICS -> CHOOSE_LANGUAGE -> QUIZ -> DONE
+
+    Each state is a method that returns the next state. All input comes from
+    `io.ask()` and all output goes through `io.show()`/`io.say()`, so the same
+    engine runs the terminal game (TerminalIO) and scripted headless games
+    (ScriptedIO).
+
+    With a `pack` (see pack.py) songs are drawn from the pack and lyrics and
+    translations come from local data, skipping the network entirely for
+    languages the pack was built with.
+    """
+
+    def __init__(self, io=None, pack=None):
+        self.io = io or TerminalIO()
+        self.pack = pack
+        self.pack_song = None
+        self.state = State.SELECT_SONG
+        self.manual_mode = False
+        self.token = None
+        self.link = None
+        self.candidates = []
+        self.song = None
+        self.lyrics = None
+        self.no_lyrics_rounds = 0
+        self.session = None
+        self._translations = []
+        self._steps = {
+            State.SELECT_SONG: self.select_song,
+            State.FETCH_LYRICS: self.fetch_lyrics,
+            State.CHOOSE_LANGUAGE: self.choose_language,
+            State.QUIZ: self.quiz,
+        }
+
+    def run(self) -> Optional[GameSession]:
+        try:
+            while self.state is not State.DONE:
+                with trace.span(f"game.{self.state.name.lower()}"):
+                    self.state = self._steps[self.state]()
+        except (KeyboardInterrupt, EOFError):
+            self.io.show("Interrupted. Exiting.")
+            self.state = State.DONE
+        finally:
+            # Drop any translations still queued if the player quit early.
+            for future in self._translations:
+                future.cancel()
+        return self.session
+
+    # --- SELECT_SONG ----------------------------------------------------
+
+    def select_song(self) -> State:
+        if self.pack is not None:
+            return self._select_from_pack()
+        self.io.welcome()
+
+        # Keep asking until the user provides a valid choice (no default).
+        while True:
+            choice = self.io.ask("Input (1 or 2): ").strip()
+            if choice in ("1", "2"): break
+            self.io.show("Invalid input. Please enter 1 or 2.")
+
+        if choice == "2":
+            return self._select_manual()
+        return self._select_from_playlist()
+
+    def _select_manual(self) -> State:
+        # Manual entry: ask for title and artist and construct a minimal song dict
+        self.io.show([
+            "Search for your song, and make sure to type carefully.",
+            "A random song may be selected if your input is not recognized.",
+        ])
+        track = self.io.ask("Song title: ").strip()
+        artist = self.io.ask("Artist name: ").strip()
+        if not track:
+            self.io.show("No song title provided. Exiting.")
+            return State.DONE
+        self.io.say("")
+        self.song = {"track_name": track, "artist_names": [artist] if artist else []}
+        self.manual_mode = True
+        return State.FETCH_LYRICS
+
+    def _select_from_pack(self) -> State:
+        if not len(self.pack):
+            self.io.show("This song pack has no songs. Exiting.")
+            return State.DONE
+        self.io.show(f"Playing offline: choosing a random song from {len(self.pack)} packed songs...")
+        self.pack_song = self.pack.random_song()
+        info = self.pack.songs[self.pack_song]
+        self.song = {"track_name": info["title"], "artist_names": [info["artist"]] if info["artist"] else []}
+        return State.CHOOSE_LANGUAGE
+
+    def _select_from_playlist(self) -> State:
+        self.token = spotify_client.get_token()
+        self.io.show([
+            "How to get the link of a playlist in Spotify:",
+            "",
+            "1. Go to your playlist and press the three dots.",
+            "2. Press 'Share' -> 'Copy playlist link'.",
+        ])
+        # Prompt until a plausible Spotify playlist link/URI is provided and songs can be fetched.
+        while True:
+            link = self.io.ask("Paste your link here: ").strip()
+            if not link:
+                self.io.show("Paste a link here. Please try again.")
+                self.io.say("")
+                continue
+            if not _is_playlist_link(link):
+                self.io.show("Invalid Spotify playlist link. Please try again.")
+                self.io.say("")
+                continue
+            self.io.show("Choosing a random song from your playlist...")
+            try:
+                candidates = lyrics_index.pick_songs(self.token, link, PROBE_CANDIDATES)
+            except Exception as e:
+                self.io.show([
+                    f"Error reading playlist: {e}",
+                    "Please check the link and your internet connection, then try again."
+                ])
+                continue
+
+            if not candidates:
+                self.io.show("Could not find a song in that playlist. Try another playlist link.")
+                continue
+
+            self.link = link
+            self.candidates = candidates
+            return State.FETCH_LYRICS
+
+    # --- FETCH_LYRICS ---------------------------------------------------
+
+    def fetch_lyrics(self) -> State:
+        # get_song returns a Lyrics object (title, artist, language, lines).
+        # Transient timeouts and throttling are retried with backoff by the
+        # shared HTTP transport.
+        if self.manual_mode:
+            return self._fetch_manual()
+        return self._fetch_from_candidates()
+
+    def _fetch_manual(self) -> State:
+        # Imported here, not at the top, to keep the game's start-up fast;
+        # the lookup below loads requests anyway.
+        import requests
+
+        track = self.song["track_name"]
+        artists = self.song["artist_names"]
+        try:
+            self.io.say("Searching for your song...")
+            self.lyrics = genius_client.get_song(track, artists[0] if artists else "")
+        except requests.exceptions.Timeout:
+            self.io.show("Search timed out after multiple attempts. Please check your internet connection and try again later.")
+            return State.DONE
+        except requests.exceptions.RequestException as e:
+            self.io.show(f"Network error while searching for song: {e}")
+            return State.DONE
+        except Exception as e:
+            # Unexpected error from the lyrics provider; show a friendly message.
+            self.io.show(f"Error while searching for song: {e}")
+            return State.DONE
+
+        if genius_client.has_lyrics(self.lyrics):
+            return State.CHOOSE_LANGUAGE
+        # If nothing was returned at all, the song was not found. If the song
+        # exists but has no lines, there are no lyrics.
+        if self.lyrics is None:
+            self.io.show("no song named that found")
+        else:
+            self.io.show("no lyrics, quitting")
+        return State.DONE
+
+    def _fetch_from_candidates(self) -> State:
+        # Search all sampled candidates at once and take the first one that
+        # has lyrics, instead of trying them one by one.
+        import requests
+
+        try:
+            song, lyrics = genius_client.find_song_with_lyrics(
+                self.candidates, on_result=lyrics_index.recorder(spotify_client.extract_playlist_id(self.link)))
+        except requests.exceptions.RequestException as e:
+            self.io.show(f"Network error while searching for songs: {e}")
+            return State.DONE
+        except Exception as e:
+            self.io.show(f"Error while searching for songs: {e}")
+            return State.DONE
+        if song:
+            self.song, self.lyrics = song, lyrics
+            return State.CHOOSE_LANGUAGE
+
+        self.io.show(f"None of {len(self.candidates)} random songs had lyrics. Choosing other songs...")
+        self.no_lyrics_rounds += 1
+        if self.no_lyrics_rounds >= MAX_NO_LYRICS_ROUNDS:
+            return self._ask_for_other_playlist()
+
+        # sample other songs from the same playlist
+        try:
+            self.candidates = lyrics_index.pick_songs(self.token, self.link, PROBE_CANDIDATES)
+        except Exception as e:
+            self.io.show(f"Error selecting another song from playlist: {e}")
+            return State.DONE
+        if not self.candidates:
+            self.io.show("Could not find another song in the playlist. Exiting.")
+            return State.DONE
+        return State.FETCH_LYRICS
+
+    def _ask_for_other_playlist(self) -> State:
+        # After several rounds, ask the user for another playlist link so they
+        # can provide a playlist that actually has lyrics. Allow the user to
+        # press ENTER to quit.
+        self.io.show("Tried several songs in this playlist but couldn't find lyrics.")
+        self.io.show("Please paste another playlist link (or press ENTER to exit):")
+        while True:
+            self.io.say("")
+            new_link = self.io.ask("link: ").strip()
+            if not new_link:
+                self.io.show("No new playlist provided. Exiting.")
+                return State.DONE
+            if not _is_playlist_link(new_link):
+                self.io.show("Invalid Spotify playlist link. Please try again or press ENTER to quit.")
+                continue
+            try:
+                new_candidates = lyrics_index.pick_songs(self.token, new_link, PROBE_CANDIDATES)
+            except Exception as e:
+                self.io.show(f"Error reading new playlist: {e}")
+                self.io.show("Please try another link or press ENTER to quit.")
+                continue
+            if not new_candidates:
+                self.io.show("Could not find a song in that playlist. Try another playlist link or press ENTER to quit.")
+                continue
+
+            # Adopt the new playlist and reset attempts
+            self.link = new_link
+            self.candidates = new_candidates
+            self.no_lyrics_rounds = 0
+            return State.FETCH_LYRICS
+
+    # --- CHOOSE_LANGUAGE ------------------------------------------------
+
+    def choose_language(self) -> State:
+        if self.pack_song is not None:
+            info = self.pack.songs[self.pack_song]
+            header, lines, lyrics_language = info["header"], self.pack.lines(self.pack_song), info["language"]
+        else:
+            header, lines, lyrics_language = self.lyrics.header, list(self.lyrics.lines), self.lyrics.language
+
+        # Display the song chosen by the program. Prefer the provider's header
+        # (which contains the canonical title and artist) when available.
+        track = self.song.get("track_name")
+        artists = self.song.get("artist_names") or []
+        display_song = header or (f"{track} - {artists[0]}" if artists else f"{track}")
+        self.io.say("")
+        self.io.show(f"Your song is: {display_song}")
+        self.io.say("")
+        self.io.show([
+            "What language do you want to translate the song to?",
+            "",
+            "e.g english, swedish, spanish...",
+        ])
+        self.io.say("")
+        user_lang = self.io.ask("Language: ").strip()
+        self.io.say()
+        code, recognized = resolve_language(user_lang)
+        if not recognized:
+            self.io.show(f"'{user_lang}' is an unknown language, defaulting to English.")
+            self.io.say("")
+
+        self.session = GameSession(display_song, lines, code, lyrics_language)
+        packed = self.pack.translations(self.pack_song, code) if self.pack_song is not None else None
+        if packed is not None:
+            # Lines the pack has no translation for are fetched now, and are
+            # left ungraded if that fails too.
+            self._translations = [_completed(t) for t in packed]
+            missing = [i for i, t in enumerate(packed) if t is None]
+            if missing:
+                fetched = translate_client.prefetch_translations([lines[i] for i in missing], code, strict=True)
+                for i, future in zip(missing, fetched):
+                    self._translations[i] = future
+            return State.QUIZ
+        if not needs_translation(lines, lyrics_language, code):
+            self.io.show(f"The song is already in {translate_client.code_to_display_name(code)}, so the lines are shown as they are.")
+            self.io.say("")
+            self._translations = [_completed(line) for line in lines]
+            return State.QUIZ
+        # Start translating the whole song in the background while the user
+        # reads the instructions, so answers are usually ready before they
+        # are needed.
+        self._translations = translate_client.prefetch_translations(lines, code)
+        return State.QUIZ
+
+    # --- QUIZ -----------------------------------------------------------
+
+    def quiz(self) -> State:
+        # For each line, ask the user to type the translation into the chosen
+        # language. After the user answers, show the correct translation.
+        self.io.show([
+            "How to play:",
+            "",
+            "1. Examine the displayed line of lyrics.",
+            "2. Try to translate to your chosen language, press ENTER when you are done.",
+            "3. Compare you answer with the actual translation.",
+            "4. When you are done, press ENTER to display the next line of lyrics.",
+            "",
+            "Leave blank to skip a line.",
+            "Press Ctrl+C to quit early.",
+        ])
+        self.io.show([
+            "Press ENTER whenever you are ready to start!",
+            "Remember that translations may be inaccurate.",
+        ])
+        # Wait for the user to press Enter before starting the game
+        self.io.ask("")
+
+        session = self.session
+        while not session.done:
+            line = session.current_line()
+            self.io.show(f"Original: {line}")
+            answer = self.io.ask("Translate: ").strip()
+
+            # The translation was requested before the quiz started; this
+            # only blocks if the background worker hasn't reached this line.
+            try:
+                with trace.span("game.wait_translation"):
+                    expected = self._translations[session.position].result()
+            except Exception:
+                expected = line
+            session.record_answer(answer, expected)
+
+            graded = session.answers[-1]
+            if expected is None:
+                self.io.show("No translation could be fetched for this line, so it isn't graded.")
+            elif graded["score"] is None:
+                self.io.show(f"Answer: {expected}")
+            else:
+                self.io.show([f"Answer: {expected}", f"{graded['verdict'].capitalize()} ({graded['score']:.0%})"])
+            # Wait for the user to press Enter before showing the next lyrics line.
+            # This ensures a line-by-line flow: translate -> see correct answer -> press Enter -> next line.
+            try:
+                self.io.ask("")
+            except (KeyboardInterrupt, EOFError):
+                self.io.say("Exiting the game.")
+                break
+
+        results = session.results()
+        if results["answered"]:
+            self.io.show(f"You got {results['correct']} of {results['answered']} answered lines right "
+                         f"({results['score'] / results['answered']:.0%} on average).")
+        return State.DONE
@@ -0,0 +1,149 @@
+"""
+Grade a player's translation against the reference translation(s).
+
+Both sides are normalized first: Unicode NFKD, accents on Latin and Greek
+letters folded away ("é" -> "e", "ø" -> "o"), case folded and punctuation
+dropped, so "¡Qué día!" and "que dia" match. Marks that spell a different
+letter in other scripts (Japanese dakuten, Devanagari vowel signs, the
+breve of Cyrillic "й") are kept and the text is recomposed with NFC. A line's score is the Levenshtein
+similarity of the normalized text or, if higher, that of its words sorted
+blended with a little of the in-order one (so word order mistakes cost
+less, but not nothing), against the best-matching reference. Scores run
+from 0.0 to 1.0.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List, Optional, Sequence, Union
+
+# Scores from these thresholds up count as correct or close.
+CORRECT = 0.9
+CLOSE = 0.7
+# How much of the sorted-words score still depends on word order, so an
+# answer with the right words in the wrong order isn't graded as perfect.
+WORD_ORDER_WEIGHT = 0.2
+
+# Letters NFKD doesn't split into base letter + accent.
+_FOLD = str.maketrans({
+    "ø": "o", "æ": "ae", "œ": "oe", "ł": "l", "đ": "d", "ð": "d", "þ": "th", "ı": "i",
+})
+_NON_WORD = re.compile(r"[\W_]+")
+# Scripts whose marks are accents players may leave out, by the Unicode
+# name prefix of the letter they sit on.
+_ACCENTED_SCRIPTS = ("LATIN", "GREEK")
+
+References = Union[str, Sequence[str]]
+
+
+def _is_mark(ch: str) -> bool:
+    return unicodedata.category(ch)[0] == "M"
+
+
+@lru_cache(maxsize=4096)
+def _is_accented_script(ch: str) -> bool:
+    return ch.isascii() or unicodedata.name(ch, "").startswith(_ACCENTED_SCRIPTS)
+
+
+@lru_cache(maxsize=8192)
+def normalize(text: str) -> str:
+    """Fold case, Latin/Greek accents and punctuation: "¡Qué  DÍA!" -> "que dia"."""
+    if not text:
+        return ""
+    text = text.casefold()
+    if text.isascii():
+        return _NON_WORD.sub(" ", text).strip()
+    kept = []
+    strip_marks = False
+    for ch in unicodedata.normalize("NFKD", text):
+        if not _is_mark(ch):
+            strip_marks = _is_accented_script(ch)
+        elif strip_marks:
+            continue
+        kept.append(ch)
+    folded = unicodedata.normalize("NFC", "".join(kept)).translate(_FOLD)
+    # Like _NON_WORD, but the marks kept above count as part of the word.
+    return " ".join("".join(ch if ch.isalnum() or _is_mark(ch) else " " for ch in folded).split())
+
+
+def levenshtein(a: str, b: str) -> int:
+    """
+    Edit distance using the bit-parallel algorithm of Myers/Hyyrö: one
+    column of the DP table is a pair of integers used as bit vectors, so the
+    cost is a few integer operations per character instead of a row of cells.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    m = len(b)
+    if not m:
+        return len(a)
+    peq = {}
+    for i, ch in enumerate(b):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv, distance = mask, 0, m
+    for ch in a:
+        eq = peq.get(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            distance += 1
+        elif mh & last:
+            distance -= 1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+    return distance
+
+
+def _ratio(a: str, b: str) -> float:
+    longest = max(len(a), len(b))
+    if not longest:
+        return 1.0
+    return 1.0 - levenshtein(a, b) / longest
+
+
+@lru_cache(maxsize=8192)
+def _sorted_words(normalized: str) -> str:
+    return " ".join(sorted(normalized.split()))
+
+
+def _similarity(answer: str, reference: str) -> float:
+    # Both already normalized.
+    if answer == reference:
+        return 1.0
+    if not answer or not reference:
+        return 0.0
+    in_order = _ratio(answer, reference)
+    any_order = _ratio(_sorted_words(answer), _sorted_words(reference))
+    return max(in_order, (1 - WORD_ORDER_WEIGHT) * any_order + WORD_ORDER_WEIGHT * in_order)
+
+
+def score(answer: str, references: References) -> float:
+    """Score one answer against one reference or several alternatives."""
+    if isinstance(references, str):
+        references = (references,)
+    normalized = normalize(answer or "")
+    if not normalized:
+        return 0.0
+    return max((_similarity(normalized, normalize(ref or "")) for ref in references), default=0.0)
+
+
+def score_batch(answers: Sequence[str], references: Sequence[References]) -> List[float]:
+    """Score many lines in one call; `references[i]` belongs to `answers[i]`."""
+    if len(answers) != len(references):
+        raise ValueError("answers and references must have the same length")
+    return [score(answer, refs) for answer, refs in zip(answers, references)]
+
+
+def verdict(line_score: Optional[float]) -> str:
+    if line_score is None:
+        return "skipped"
+    if line_score >= CORRECT:
+        return "correct"
+    if line_score >= CLOSE:
+        return "close"
+    return "wrong"
@@ -0,0 +1,241 @@
+"""
+Offline song packs: a playlist's lyrics and their translations in one file.
+
+    python pack.py build <playlist link> --lang sv,es -o party.lyrpack
+    python pack.py info party.lyrpack
+    python main.py --pack party.lyrpack
+    python server.py --pack party.lyrpack
+
+Building resolves the playlist, fetches and cleans every song's lyrics and
+batch-translates all quiz lines into each language. Playing from a pack needs
+no network at all.
+
+File layout (all integers little-endian uint32):
+
+    b"LYRPACK1" | index length | index (UTF-8 JSON) | columns...
+
+The index lists the songs (title, artist, header, lyrics language and the
+range of their lines) and, for each column, where it starts. A column is one
+text per line of every song: first "original", then one per language. Each
+column is an offsets array of `line_count + 1` integers followed by the
+UTF-8 blob of all its lines, so line i is `blob[offsets[i]:offsets[i + 1]]`.
+
+At play time the file is memory-mapped read-only, so opening a pack costs
+only the index and server workers opening the same pack share one copy in
+the page cache.
+"""
+import argparse
+import json
+import mmap
+import random
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+MAGIC = b"LYRPACK1"
+VERSION = 1
+ORIGINAL = "original"
+# Songs looked up and translated at the same time while building.
+BUILD_WORKERS = 8
+
+_U32 = struct.Struct("<I")
+_BOUNDS = struct.Struct("<2I")
+
+
+class PackError(Exception):
+    pass
+
+
+class SongPack:
+    """A read-only, memory-mapped song pack."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self._mm.close()
+            raise PackError(f"{path} is not a Lyringo song pack")
+        (index_len,) = _U32.unpack_from(self._mm, len(MAGIC))
+        start = len(MAGIC) + _U32.size
+        index = json.loads(self._mm[start:start + index_len].decode("utf-8"))
+        if index.get("version") != VERSION:
+            self._mm.close()
+            raise PackError(f"{path} has unsupported pack version {index.get('version')}")
+        self.playlist = index.get("playlist")
+        self.songs = index["songs"]
+        self.languages = [c for c in index["columns"] if c != ORIGINAL]
+        self.line_count = index["line_count"]
+        # column name -> (offsets position, blob position), absolute in the file
+        self._columns = {name: tuple(pos) for name, pos in index["columns"].items()}
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.songs)
+
+    def _line(self, column: str, i: int) -> str:
+        offsets_pos, blob_pos = self._columns[column]
+        start, end = _BOUNDS.unpack_from(self._mm, offsets_pos + i * _U32.size)
+        return self._mm[blob_pos + start:blob_pos + end].decode("utf-8")
+
+    def _column(self, column: str, song_index: int) -> List[str]:
+        first, count = self.songs[song_index]["lines"]
+        return [self._line(column, first + i) for i in range(count)]
+
+    def lines(self, song_index: int) -> List[str]:
+        """The quiz lines of one song."""
+        return self._column(ORIGINAL, song_index)
+
+    def translations(self, song_index: int, language: str) -> Optional[List[Optional[str]]]:
+        """
+        The translations of one song's lines, or None if the pack wasn't
+        built for that language. Lines that couldn't be translated are None.
+        """
+        if language not in self.languages:
+            return None
+        return [t or None for t in self._column(language, song_index)]
+
+    def random_song(self) -> int:
+        return random.randrange(len(self.songs))
+
+
+def write_pack(path: str, songs: List[dict], languages: List[str], playlist: Optional[str] = None) -> None:
+    """
+    Write a pack. Each song is a dict with "title", "artist", "header",
+    "language", "lines" and "translations" ({language: [text or None]}).
+    """
+    columns = {ORIGINAL: []}
+    for lang in languages:
+        columns[lang] = []
+    index_songs = []
+    for song in songs:
+        index_songs.append({
+            "title": song["title"],
+            "artist": song["artist"],
+            "header": song["header"],
+            "language": song.get("language"),
+            "lines": [len(columns[ORIGINAL]), len(song["lines"])],
+        })
+        columns[ORIGINAL].extend(song["lines"])
+        for lang in languages:
+            columns[lang].extend(t or "" for t in song["translations"][lang])
+
+    encoded = {}
+    for name, texts in columns.items():
+        offsets, blob = [0], bytearray()
+        for text in texts:
+            blob += text.encode("utf-8")
+            offsets.append(len(blob))
+        encoded[name] = (struct.pack(f"<{len(offsets)}I", *offsets), bytes(blob))
+
+    # The index records absolute column positions, which depend on the
+    # index's own length; the positions are fixed-width numbers, so encode
+    # once with placeholders to learn the length, then for real.
+    def build_index(column_positions):
+        return json.dumps({
+            "version": VERSION,
+            "playlist": playlist,
+            "line_count": len(columns[ORIGINAL]),
+            "songs": index_songs,
+            "columns": column_positions,
+        }, ensure_ascii=False).encode("utf-8")
+
+    placeholder = {name: [0xFFFFFFFF, 0xFFFFFFFF] for name in encoded}
+    pos = len(MAGIC) + _U32.size + len(build_index(placeholder))
+    positions = {}
+    for name, (offsets, blob) in encoded.items():
+        positions[name] = [pos, pos + len(offsets)]
+        pos += len(offsets) + len(blob)
+    index = build_index(positions).ljust(len(build_index(placeholder)))
+    if pos > 0xFFFFFFFF:
+        raise PackError("Pack is too large (over 4 GiB)")
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_U32.pack(len(index)))
+        f.write(index)
+        for offsets, blob in encoded.values():
+            f.write(offsets)
+            f.write(blob)
+
+
+def build(link: str, languages: List[str], output: str, workers: int = BUILD_WORKERS) -> Dict[str, int]:
+    """Build a pack from a Spotify playlist. Returns counts for the report."""
+    # Imported here so reading a pack never loads the API clients.
+    import api.spotify as spotify_client
+    import game
+
+    token = spotify_client.get_token()
+    tracks = spotify_client.get_playlist_by_link(token, link)
+    songs, failed = [], 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(game.prepare_song, track, languages) for track in tracks]
+        for track, future in zip(tracks, futures):
+            try:
+                song = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  failed: {track.get('track_name')}: {e}", file=sys.stderr)
+                continue
+            if song:
+                songs.append(song)
+    write_pack(output, songs, languages, playlist=link)
+    return {
+        "tracks": len(tracks),
+        "songs": len(songs),
+        "no_lyrics": len(tracks) - len(songs) - failed,
+        "failed": failed,
+        "lines": sum(len(s["lines"]) for s in songs),
+        # Lines whose translation failed; the pack stores them as missing.
+        "untranslated": sum(t is None for s in songs for lang in languages for t in s["translations"][lang]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect offline Lyringo song packs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_cmd = commands.add_parser("build", help="build a pack from a Spotify playlist")
+    build_cmd.add_argument("playlist", help="Spotify playlist link or URI")
+    build_cmd.add_argument("--lang", required=True, help="comma separated languages, e.g. sv,es or swedish,spanish")
+    build_cmd.add_argument("-o", "--output", default="songs.lyrpack")
+    build_cmd.add_argument("--workers", type=int, default=BUILD_WORKERS)
+
+    info_cmd = commands.add_parser("info", help="describe a pack")
+    info_cmd.add_argument("pack")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        import game
+
+        try:
+            languages = game.parse_languages(args.lang)
+        except ValueError as e:
+            parser.error(str(e))
+        start = time.perf_counter()
+        counts = build(args.playlist, languages, args.output, args.workers)
+        print(f"Wrote {args.output}: {counts['songs']} of {counts['tracks']} tracks, {counts['lines']} lines, "
+              f"languages {', '.join(languages)} ({counts['no_lyrics']} without lyrics, {counts['failed']} failed, "
+              f"{counts['untranslated']} untranslated lines) "
+              f"in {time.perf_counter() - start:.1f} s")
+    else:
+        with SongPack(args.pack) as pack:
+            print(f"{args.pack}: {len(pack)} songs, {pack.line_count} lines, languages: {', '.join(pack.languages)}")
+            if pack.playlist:
+                print(f"built from {pack.playlist}")
+            for song in pack.songs:
+                print(f"  {song['header']} ({song['lines'][1]} lines)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Pre-warm the caches for a playlist: fetch every track's lyrics and translate
+them into the target languages, so later games never wait on the network.
+
+    python prewarm.py <playlist link> --lang sv,es [--workers 8]
+
+Languages default to $LYRINGO_LANGUAGES. Each track is reported with its
+time and outcome as it finishes. Progress is kept in the on-disk cache, so
+an interrupted run (Ctrl+C) picks up where it stopped when started again;
+--force warms every track anyway.
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+import api.genius as genius_client
+import api.lyrics_index as lyrics_index
+import api.spotify as spotify_client
+import api.translate as translate_client
+from api import config
+from api.cache import PersistentCache
+import game
+
+PREWARM_WORKERS = 8
+
+# A finished track stays "done" only as long as what it warmed stays cached.
+progress = PersistentCache(
+    "prewarm",
+    ttl=min(genius_client.LYRICS_TTL, translate_client.TRANSLATION_TTL),
+    max_entries=20000,
+    memory_entries=256,
+)
+
+
+def _progress_key(playlist_id: str, song: dict) -> str:
+    artists = ", ".join(song.get("artist_names") or [])
+    return f"{playlist_id}\x1f{song['track_name']}\x1f{artists}".casefold()
+
+
+def _is_done(key: str, languages: List[str]) -> bool:
+    entry = progress.get(key)
+    if entry is None:
+        return False
+    # Tracks without lyrics have nothing to translate.
+    return not entry["has_lyrics"] or set(languages) <= set(entry["languages"])
+
+
+def _warm(song: dict, languages: List[str]):
+    start = time.perf_counter()
+    prepared = game.prepare_song(song, languages)
+    return prepared, time.perf_counter() - start
+
+
+def prewarm(link: str, languages: List[str], workers: int = PREWARM_WORKERS, force: bool = False) -> Dict[str, int]:
+    """Warm the caches for every track of a playlist. Returns counts for the report."""
+    playlist_id = spotify_client.extract_playlist_id(link)
+    token = spotify_client.get_token()
+    tracks = spotify_client.get_playlist_by_link(token, link)
+    keys = [_progress_key(playlist_id, song) for song in tracks]
+    todo = [(song, key) for song, key in zip(tracks, keys) if force or not _is_done(key, languages)]
+    counts = {"tracks": len(tracks), "skipped": len(tracks) - len(todo), "warmed": 0, "no_lyrics": 0, "failed": 0}
+    print(f"{len(tracks)} tracks, {counts['skipped']} already warm, {len(todo)} to go "
+          f"({', '.join(languages) or 'lyrics only'})")
+
+    # Outcomes for the playlist's lyrics index, written once at the end.
+    found = []
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(_warm, song, languages): (song, key) for song, key in todo}
+        for n, future in enumerate(as_completed(futures), 1):
+            song, key = futures[future]
+            name = f"{song['track_name']} - {', '.join(song.get('artist_names') or [])}"
+            try:
+                prepared, seconds = future.result()
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"[{n}/{len(todo)}]   failed  {name}: {e}", file=sys.stderr)
+                continue
+            if prepared is None:
+                counts["no_lyrics"] += 1
+                # Retry later: the negative lyrics cache entry expires sooner.
+                progress.set(key, {"has_lyrics": False, "languages": []}, ttl=genius_client.NO_LYRICS_TTL)
+                found.append((song, False, None))
+                outcome = "no lyrics"
+            else:
+                found.append((song, True, prepared["language"]))
+                # Languages with lines that couldn't be translated aren't
+                # recorded, so a later run retries them.
+                translated = [lang for lang in languages if None not in prepared["translations"][lang]]
+                previous = progress.get(key) or {}
+                progress.set(key, {"has_lyrics": True,
+                                   "languages": sorted(set(translated) | set(previous.get("languages") or []))})
+                untranslated = [lang for lang in languages if lang not in translated]
+                if untranslated:
+                    counts["failed"] += 1
+                    print(f"[{n}/{len(todo)}]   failed  {name}: lines not translated to "
+                          f"{', '.join(untranslated)}", file=sys.stderr)
+                    continue
+                counts["warmed"] += 1
+                outcome = f"{len(prepared['lines'])} lines"
+            print(f"[{n}/{len(todo)}] {seconds:6.2f} s  {name} ({outcome})")
+    finally:
+        # On Ctrl+C, drop the queued tracks; the finished ones are recorded.
+        pool.shutdown(wait=True, cancel_futures=True)
+        lyrics_index.record_many(playlist_id, found)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch and translate the lyrics of a whole playlist ahead of time.")
+    parser.add_argument("playlist", help="Spotify playlist link or URI")
+    parser.add_argument("--lang", default=config.get("LYRINGO_LANGUAGES", ""),
+                        help="comma separated languages, e.g. sv,es (default: $LYRINGO_LANGUAGES)")
+    parser.add_argument("--workers", type=int, default=PREWARM_WORKERS)
+    parser.add_argument("--force", action="store_true", help="warm tracks that are already done")
+    args = parser.parse_args()
+    try:
+        languages = game.parse_languages(args.lang)
+    except ValueError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    try:
+        counts = prewarm(args.playlist, languages, args.workers, args.force)
+    except KeyboardInterrupt:
+        print("Interrupted. Run the same command again to continue where it stopped.")
+        sys.exit(130)
+    print(f"Done in {time.perf_counter() - start:.1f} s: {counts['warmed']} warmed, {counts['no_lyrics']} without lyrics, "
+          f"{counts['failed']} failed, {counts['skipped']} already warm.")
+
+
+if __name__ == "__main__":
+    main()
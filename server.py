@@ -0,0 +1,306 @@
+"""
+Serve Lyringo games over HTTP so many players can share one process.
+
+    python server.py --host 127.0.0.1 --port 8000 [--pack songs.lyrpack]
+
+All sessions run on one asyncio event loop and share the lyrics/translation
+caches and the HTTP connection pools. The API speaks JSON:
+
+    POST   /sessions                  {"title", "artist", "language"} or
+                                      {"playlist", "language"} or, with a
+                                      pack, just {"language"}
+    GET    /sessions/<id>             current line and progress
+    POST   /sessions/<id>/answer      {"answer"} -> expected translation (null if none could
+                                      be fetched: not graded), grade + next line
+    DELETE /sessions/<id>
+    GET    /stats                     sessions, cache hit rates, upstream latency
+"""
+import argparse
+import asyncio
+import json
+import time
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+import api.genius as genius_client
+import api.lyrics_index as lyrics_index
+import api.spotify as spotify_client
+import api.translate as translate_client
+from api import async_transport, transport
+import game
+import pack
+
+# Idle sessions are dropped after this many seconds.
+SESSION_TTL = 30 * 60
+SWEEP_INTERVAL = 60
+# Requests bodies are tiny JSON documents; refuse anything bigger.
+MAX_BODY_BYTES = 64 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _text(body: dict, name: str) -> str:
+    """The string field `name` of a request body, stripped; "" if missing."""
+    value = body.get(name)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise HTTPError(400, f"'{name}' must be a string.")
+    return value.strip()
+
+
+class GameServer:
+    """Keeps the sessions and answers the JSON API."""
+
+    def __init__(self, pack=None):
+        self.pack = pack
+        self.sessions = {}
+        self._translations = {}
+        self.sessions_created = 0
+        self.started = time.monotonic()
+
+    # --- game API -------------------------------------------------------
+
+    async def create_session(self, body: dict) -> dict:
+        playlist, title, artist = _text(body, "playlist"), _text(body, "title"), _text(body, "artist")
+        code, _ = game.resolve_language(_text(body, "language"))
+
+        if playlist:
+            token = await asyncio.to_thread(spotify_client.get_token)
+            # Like the terminal game: sample a few tracks (preferring ones
+            # known to have lyrics) instead of downloading the playlist.
+            candidates = await lyrics_index.apick_songs(token, playlist, game.PROBE_CANDIDATES)
+            if not candidates:
+                raise HTTPError(404, "Could not find a song in that playlist.")
+            _, lyrics = await genius_client.afind_song_with_lyrics(
+                candidates, on_result=lyrics_index.recorder(spotify_client.extract_playlist_id(playlist)))
+        elif title:
+            lyrics = await genius_client.aget_song(title, artist)
+        elif self.pack is not None and len(self.pack):
+            return self._create_pack_session(code)
+        else:
+            raise HTTPError(400, "Send a 'title' (and 'artist') or a 'playlist' link.")
+
+        if not genius_client.has_lyrics(lyrics):
+            raise HTTPError(404, "No lyrics found for that song.")
+
+        lines = list(lyrics.lines)
+        session = game.GameSession(lyrics.header, lines, code, lyrics.language)
+        self.sessions[session.id] = session
+        self.sessions_created += 1
+        self._start_translations(session)
+        return session.to_dict()
+
+    def _create_pack_session(self, code: str) -> dict:
+        # Lyrics come from the memory-mapped pack; translations too when the
+        # pack was built with the language, otherwise they are fetched.
+        index = self.pack.random_song()
+        info = self.pack.songs[index]
+        lines = self.pack.lines(index)
+        session = game.GameSession(info["header"], lines, code, info["language"])
+        self.sessions[session.id] = session
+        self.sessions_created += 1
+        self._start_translations(session, self.pack.translations(index, code))
+        return session.to_dict()
+
+    def _start_translations(self, session: game.GameSession, translations=None) -> None:
+        # Translate the whole song while the player reads the first line,
+        # unless the pack has the translations or the song is already in the
+        # chosen language.
+        if translations is None and not game.needs_translation(session.lines, session.lyrics_language, session.language):
+            translations = list(session.lines)
+        if translations is None:
+            self._translations[session.id] = asyncio.create_task(
+                translate_client.atranslate_lines(session.lines, session.language))
+        elif None in translations:
+            self._translations[session.id] = asyncio.create_task(
+                self._fill_missing(session.lines, translations, session.language))
+        else:
+            done = asyncio.get_running_loop().create_future()
+            done.set_result(translations)
+            self._translations[session.id] = done
+
+    @staticmethod
+    async def _fill_missing(lines, translations, language: str) -> list:
+        # Fetch the lines a pack has no translation for. Lines that still
+        # fail stay None and are not graded.
+        missing = [i for i, text in enumerate(translations) if text is None]
+        fetched = await translate_client.atranslate_lines([lines[i] for i in missing], language, strict=True)
+        filled = list(translations)
+        for i, text in zip(missing, fetched):
+            filled[i] = text
+        return filled
+
+    def get_session(self, session_id: str) -> game.GameSession:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPError(404, "Unknown or expired session.")
+        return session
+
+    async def answer(self, session_id: str, body: dict) -> dict:
+        session = self.get_session(session_id)
+        answer = _text(body, "answer")
+        if session.done:
+            raise HTTPError(409, "This game is already finished.")
+        task = self._translations[session_id]
+        try:
+            # Shielded so a client going away doesn't cancel the translation
+            # other answers to this session are waiting for.
+            translations = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                # The session was ended or expired while we waited.
+                raise HTTPError(404, "Unknown or expired session.")
+            raise
+        # Other answers to this session may have been recorded while this one
+        # waited: check again, and take the line and its translation from
+        # the same position.
+        if session.done:
+            raise HTTPError(409, "This game is already finished.")
+        line = session.current_line()
+        expected = translations[session.position]
+        session.record_answer(answer, expected)
+        graded = session.answers[-1]
+        return {"original": line, "expected": expected, "line_score": graded["score"],
+                "verdict": graded["verdict"], **session.to_dict()}
+
+    def end_session(self, session_id: str) -> dict:
+        self.get_session(session_id)
+        self._drop(session_id)
+        return {"session": session_id, "deleted": True}
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "sessions_created": self.sessions_created,
+            "pack": self.pack.path if self.pack is not None else None,
+            "uptime_s": round(time.monotonic() - self.started, 1),
+            "caches": {
+                "lyrics": genius_client.cache.stats(),
+                "translations": translate_client.cache.stats(),
+                "playlists": spotify_client.playlist_cache.stats(),
+            },
+            "upstream_latency": transport.latency_stats(),
+        }
+
+    def _drop(self, session_id: str) -> None:
+        self.sessions.pop(session_id, None)
+        task = self._translations.pop(session_id, None)
+        if task is not None:
+            task.cancel()
+
+    async def sweep(self) -> None:
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            cutoff = time.monotonic() - SESSION_TTL
+            for session_id in [s.id for s in self.sessions.values() if s.touched < cutoff]:
+                self._drop(session_id)
+
+    # --- HTTP -----------------------------------------------------------
+
+    async def dispatch(self, method: str, target: str, body: bytes):
+        parts = [p for p in urlsplit(target).path.split("/") if p]
+        payload = json.loads(body) if body else {}
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "Expected a JSON object.")
+
+        if parts == ["sessions"] and method == "POST":
+            return 201, await self.create_session(payload)
+        if len(parts) == 2 and parts[0] == "sessions":
+            if method == "GET":
+                return 200, self.get_session(parts[1]).to_dict()
+            if method == "DELETE":
+                return 200, self.end_session(parts[1])
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "answer" and method == "POST":
+            return 200, await self.answer(parts[1], payload)
+        if parts == ["stats"] and method == "GET":
+            return 200, self.stats()
+        raise HTTPError(404, "Not found.")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if length > MAX_BODY_BYTES:
+                    status, payload, keep_alive = 413, {"error": "Request body too large."}, False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        status, payload = await self.dispatch(method, target, body)
+                    except HTTPError as e:
+                        status, payload = e.status, {"error": e.message}
+                    except json.JSONDecodeError:
+                        status, payload = 400, {"error": "Invalid JSON."}
+                    except Exception as e:
+                        # An upstream API failed; report it without killing the connection.
+                        status, payload = 502, {"error": f"Upstream error: {e}"}
+
+                data = json.dumps(payload).encode("utf-8")
+                head = (
+                    f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                )
+                writer.write(head.encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000) -> asyncio.AbstractServer:
+        """Start listening; `port=0` picks a free port (see `server.sockets`)."""
+        self._sweeper = asyncio.create_task(self.sweep())
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def serve(host: str, port: int, song_pack=None):
+    game_server = GameServer(song_pack)
+    server = await game_server.start(host, port)
+    print(f"Lyringo server listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await async_transport.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Lyringo games over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pack", help="serve songs from a pack built with pack.py")
+    args = parser.parse_args()
+    song_pack = pack.SongPack(args.pack) if args.pack else None
+    try:
+        asyncio.run(serve(args.host, args.port, song_pack))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if song_pack is not None:
+            song_pack.close()
+
+
+if __name__ == "__main__":
+    main()